@@ -1,31 +1,82 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, UploadFile, File, Form, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, PlainTextResponse, StreamingResponse, FileResponse, Response
 from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
 from datetime import datetime
-import bcrypt
+import asyncio
+import hashlib
+import orjson
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+from dotenv import load_dotenv
+
+# Settings (STUDYQR_*) are read when src is imported, so the project's .env
+# is loaded first; variables already set in the environment take precedence.
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
 
 try:
-    from src.logic import UserManager, NoteManager
+    from src.logic import AsyncUserManager, AsyncNoteManager, NoteManager
+    from src import async_db, cache, db, ingest, metrics, passwords, profiler, publish, qr, sessions, storage
 except ModuleNotFoundError:
     # Ensure project root is on sys.path when running via different CWDs
-    import os, sys
+    import sys
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-    from src.logic import UserManager, NoteManager
+    from src.logic import AsyncUserManager, AsyncNoteManager, NoteManager
+    from src import async_db, cache, db, ingest, metrics, passwords, profiler, publish, qr, sessions, storage
+
+# Endpoints are async; database work runs on async_db's reader/writer threads
+_notes = NoteManager()
+user_manager = AsyncUserManager()
+note_manager = AsyncNoteManager(_notes)
+
+router = APIRouter()
+
+# Base URL encoded into QR codes; defaults to the URL the request came in on.
+# With static publishing enabled, codes point at the published page instead.
+PUBLIC_URL = os.getenv("STUDYQR_PUBLIC_URL")
+# Largest request body /notes/bulk will buffer (attachments arrive inline as base64)
+BULK_MAX_BYTES = int(os.getenv("STUDYQR_BULK_MAX_BYTES", str(64 * 1024 * 1024)))
+
+def _cache_metrics():
+    stats = cache.stats()
+    yield ("studyqr_cache_hits_total", "counter", "Read-through cache hits.",
+           [({"cache": name}, s["hits"]) for name, s in stats.items()])
+    yield ("studyqr_cache_misses_total", "counter", "Read-through cache misses.",
+           [({"cache": name}, s["misses"]) for name, s in stats.items()])
+    yield ("studyqr_cache_entries", "gauge", "Entries currently cached.",
+           [({"cache": name}, s["size"]) for name, s in stats.items()])
 
-user_manager = UserManager()
-note_manager = NoteManager()
+metrics.add_collector(_cache_metrics)
 
-app = FastAPI(title="STUDYQR API", version="1.0")
+# Schema setup and background workers start with the server, not at import
+@asynccontextmanager
+async def lifespan(app):
+    await asyncio.to_thread(db.init_db)
+    ingest.start()
+    try:
+        yield
+    finally:
+        ingest.stop()
+        passwords.shutdown()
+        async_db.shutdown()
 
-# Allow CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def _hasher_busy(exc):
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+
+# Signed session token from /login, sent as "Authorization: Bearer <token>".
+# Verified without touching the database; async so it stays off the threadpool.
+async def current_user_id(authorization: str | None = Header(default=None)):
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Login required", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        user_id, _ = sessions.verify(token)
+    except sessions.InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    return user_id
 
 # ----------------- Pydantic Models -----------------
 class User(BaseModel):
@@ -45,124 +96,435 @@ class Note(BaseModel):
     created_at: str = Field(default_factory=lambda: str(datetime.utcnow()))
 
 # ----------------- User Endpoints -----------------
-@app.post("/register")
-def register_user(user: User):
-    hashed_pw = bcrypt.hashpw(user.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-    result = user_manager.add_user(user.username, hashed_pw, user.email)
+@router.post("/register")
+async def register_user(user: User):
+    try:
+        hashed_pw = await passwords.hash_password(user.password)
+    except passwords.PasswordHasherBusy as e:
+        raise _hasher_busy(e)
+    result = await user_manager.add_user(user.username, hashed_pw, user.email)
     if not result.get("Success"):
         raise HTTPException(status_code=400, detail=result.get("Message"))
-    return {"success": True, "data": result["data"]}
+    return ORJSONResponse({"success": True, "data": result["data"]})
 
-@app.post("/login")
-def login_user(login: Login):
-    result = user_manager.login_user(login.email, login.password)
+@router.post("/login")
+async def login_user(login: Login):
+    try:
+        result = await user_manager.login_user(login.email, login.password)
+    except passwords.PasswordHasherBusy as e:
+        raise _hasher_busy(e)
     if not result.get("Success"):
         raise HTTPException(status_code=401, detail=result.get("Message"))
-    return {"success": True, "user_id": result["user_id"], "user_name": result["user_name"]}
+    return {"success": True, "user_id": result["user_id"], "user_name": result["user_name"],
+            "token": result["token"], "expires_at": result["expires_at"]}
 
-@app.get("/users")
-def get_users():
-    return {"success": True, "data": user_manager.get_users()}
+@router.get("/users")
+async def get_users(
+    after_id: int | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    fields: str | None = None
+):
+    result = await user_manager.list_users(after_id, limit, order, fields)
+    if not result.get("Success"):
+        raise HTTPException(status_code=400, detail=result.get("Message"))
+    return ORJSONResponse({"success": True, "data": result["data"], "next_cursor": result["next_cursor"]})
+
+# Users with note counts and latest notes, so the admin page needs one request
+@router.get("/users/summary")
+async def get_users_summary(
+    after_id: int | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    notes_per_user: int = Query(10, ge=0, le=100)
+):
+    result = await user_manager.list_users_summary(after_id, limit, notes_per_user)
+    if not result.get("Success"):
+        raise HTTPException(status_code=400, detail=result.get("Message"))
+    return ORJSONResponse({"success": True, "data": result["data"], "next_cursor": result["next_cursor"]})
 
 # ----------------- Notes Endpoints -----------------
 # Create note via multipart form (optional file)
-@app.post("/notes")
-def create_note(
+@router.post("/notes")
+async def create_note(
     content: str = Form(...),
     subject: str = Form(...),
     user_id: int = Form(...),
     file: UploadFile | None = File(default=None)
 ):
     file_name = None
-    file_bytes = None
+    file_stream = None
     if file is not None:
         file_name = file.filename
-        file_bytes = file.file.read()
-    result = note_manager.add_note(content, "", user_id, subject, str(datetime.utcnow()), file_name=file_name, file_data=file_bytes)
+        # Hand over the spooled upload itself so it is copied to the store in chunks
+        file_stream = file.file
+    result = await note_manager.add_note(content, "", user_id, subject, str(datetime.utcnow()), file_name=file_name, file_data=file_stream)
     if not result.get("Success"):
         raise HTTPException(status_code=400, detail=result.get("Message"))
-    return {"success": True, "data": result["data"]}
+    return ORJSONResponse({"success": True, "data": result["data"]})
 
-@app.get("/notes/user/{user_id}")
-def get_user_notes(user_id: int):
-    notes = note_manager.get_notes_by_user(user_id)
-    return {"success": True, "data": notes}
+# Keyset-paginated by (created_at, Id); pass next_cursor back as after_id
+@router.get("/notes/user/{user_id}")
+async def get_user_notes(
+    user_id: int,
+    after_id: int | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    fields: str | None = None
+):
+    result = await note_manager.list_notes_by_user(user_id, after_id, limit, order, fields)
+    if not result.get("Success"):
+        raise HTTPException(status_code=400, detail=result.get("Message"))
+    return ORJSONResponse({"success": True, "data": result["data"], "next_cursor": result["next_cursor"]})
+
+async def _read_body(request, limit):
+    # Chunked uploads carry no Content-Length, so the stream is counted as well
+    too_large = HTTPException(status_code=413, detail=f"Request body larger than {limit} bytes")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise too_large
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+# Bulk import: JSON array or NDJSON (one note per line); attachments as base64 "file_data"
+@router.post("/notes/bulk")
+async def bulk_import_notes(request: Request):
+    body = await _read_body(request, BULK_MAX_BYTES)
+    if "ndjson" in request.headers.get("content-type", "") or not body.lstrip().startswith(b"["):
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(orjson.loads(line))
+            except ValueError:
+                items.append(None)  # reported per item by import_notes
+    else:
+        try:
+            items = orjson.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    result = await note_manager.import_notes(items)
+    if not result.get("Success"):
+        raise HTTPException(status_code=400, detail={"message": result.get("Message"), "errors": result.get("errors", [])})
+    return ORJSONResponse({"success": True, "data": result["data"], "errors": result["errors"]})
+
+# Streamed export of all of a user's notes, as NDJSON or a ZIP with attachments
+@router.get("/notes/user/{user_id}/export")
+async def export_user_notes(
+    user_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|zip)$"),
+    include_files: bool = False
+):
+    if format == "zip":
+        return StreamingResponse(note_manager.iter_export_zip(user_id), media_type="application/zip", headers={
+            "Content-Disposition": f"attachment; filename=\"notes_user_{user_id}.zip\""
+        })
+    return StreamingResponse(note_manager.iter_export(user_id, include_files), media_type="application/x-ndjson")
+
+# Full-text search ranked by BM25 (newest-first for very common terms); end a word with * for a prefix match
+@router.get("/notes/search")
+async def search_notes(
+    q: str = Query(..., min_length=1),
+    user_id: int | None = None,
+    subject: str | None = None,
+    limit: int = Query(20, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    result = await note_manager.search_notes(q, user_id, subject, limit, offset)
+    if not result.get("Success"):
+        raise HTTPException(status_code=400, detail=result.get("Message"))
+    return ORJSONResponse({"success": True, "data": result["data"], "next_offset": result["next_offset"],
+                           "ordering": result["ordering"]})
+
+def _not_modified(request, etag, last_modified=None):
+    # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in if_none_match or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if last_modified is not None and if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _serialize_note(note):
+    # (body, ETag) of GET /notes/{id}; the tag leads with the version so it
+    # can be sent back as If-Match on PUT
+    body = orjson.dumps({"success": True, "data": note})
+    return body, f"\"{note.version}-{hashlib.sha1(body).hexdigest()[:16]}\""
 
-@app.get("/notes/{note_id}")
-def get_note(note_id: int):
-    note = note_manager.get_note_by_id(note_id)
+@router.get("/notes/{note_id}")
+async def get_note(note_id: int, request: Request):
+    note = await note_manager.get_note_by_id(note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
-    return {"success": True, "data": note}
+    body, etag = _serialize_note(note)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-# Human-friendly view for QR scan: show content and link to file
-@app.get("/notes/view/{note_id}", response_class=HTMLResponse)
-def view_note(note_id: int):
-    note = note_manager.get_note_by_id(note_id)
-    if not note:
+def _note_view_url(request, note_id):
+    if publish.ENABLED:
+        return publish.page_url(note_id)
+    base_url = PUBLIC_URL or str(request.base_url)
+    return f"{base_url.rstrip('/')}/notes/view/{note_id}"
+
+# QR code pointing at the note's view page; images are cached and immutable per URL/options
+@router.get("/notes/{note_id}/qr.{fmt}")
+async def get_note_qr(
+    note_id: int,
+    fmt: str,
+    request: Request,
+    size: int = Query(10, ge=1, le=40),
+    ec: str = Query("M", pattern="^[LMQH]$")
+):
+    if fmt not in qr.MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Unsupported QR format")
+    result = await note_manager.get_note_qr(note_id, _note_view_url(request, note_id), fmt, size, ec)
+    if result is None:
         raise HTTPException(status_code=404, detail="Note not found")
-    file_section = ""
-    if note.get("file_name"):
-        file_section = f"<p><a href=\"/notes/download/{note_id}\">Download file ({note['file_name']})</a></p>"
-    html = f"""
-    <html>
-      <head><title>{note.get('subject','Note')}</title></head>
-      <body>
-        <h2>{note.get('subject','')}</h2>
-        <pre style=\"white-space: pre-wrap; font-family: inherit; border: 1px solid #ddd; padding: 12px;\">{note.get('content','')}</pre>
-        {file_section}
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
-
-# Download attached file if present
-@app.get("/notes/download/{note_id}")
-def download_note_file(note_id: int):
-    note = note_manager.get_note_by_id(note_id)
+    image, key = result
+    etag = f"\"{key}\""
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=image, media_type=qr.MEDIA_TYPES[fmt], headers=headers)
+
+def _render_note_page(note_id):
+    # Runs on a reader thread as the view_pages cache loader
+    note = _notes.get_note_by_id(note_id)
     if not note:
+        return None
+    html = publish.render_page(note, f"/notes/download/{note_id}")
+    return {
+        "html": html,
+        "etag": f"\"{hashlib.sha1(html.encode('utf-8')).hexdigest()}\"",
+        "last_modified": time.time(),
+    }
+
+# First-page preview of a PDF attachment, available once extraction has finished
+@router.get("/notes/{note_id}/thumbnail.png")
+async def get_note_thumbnail(note_id: int, request: Request):
+    thumbnail = await note_manager.get_note_thumbnail(note_id)
+    if not thumbnail:
+        raise HTTPException(status_code=404, detail="No thumbnail for this note")
+    etag = f"\"{thumbnail['file_hash']}\""
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(thumbnail["path"], media_type="image/png", headers=headers)
+
+@router.get("/ingest/stats")
+async def ingest_stats():
+    return {"success": True, "data": await note_manager.extraction_stats()}
+
+# Human-friendly view for QR scan: show content and link to file.
+# The rendered page is cached until the note changes; repeat scans revalidate via ETag.
+@router.get("/notes/view/{note_id}", response_class=HTMLResponse)
+async def view_note(note_id: int, request: Request):
+    page = await async_db.read(cache.view_pages.get_or_load, note_id, lambda: _render_note_page(note_id))
+    if not page:
         raise HTTPException(status_code=404, detail="Note not found")
-    from src import db
-    row = db.get_note_by_id_db(note_id)
-    if not row or len(row) < 8 or row[7] is None:
+    headers = {
+        "ETag": page["etag"],
+        "Last-Modified": formatdate(page["last_modified"], usegmt=True),
+        "Cache-Control": "public, max-age=0, must-revalidate",
+    }
+    if _not_modified(request, page["etag"], page["last_modified"]):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=page["html"], headers=headers)
+
+def _parse_range(range_header, file_size):
+    # Single "bytes=start-end" ranges only; anything else is served in full.
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start, _, end = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start:
+            first = int(start)
+            last = int(end) if end else file_size - 1
+        else:
+            first = max(file_size - int(end), 0)
+            last = file_size - 1
+    except ValueError:
+        return None
+    if first > last or first >= file_size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{file_size}"})
+    return first, min(last, file_size - 1)
+
+def _content_disposition(file_name):
+    # The header FileResponse(filename=...) sends: names that are not plain
+    # ASCII (or contain quotes) go in an RFC 5987 filename* parameter
+    quoted = quote(file_name)
+    if quoted != file_name:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f"attachment; filename=\"{file_name}\""
+
+# Download attached file if present; supports Range and If-None-Match
+@router.get("/notes/download/{note_id}")
+async def download_note_file(note_id: int, request: Request):
+    attachment = await note_manager.get_note_file(note_id)
+    if not attachment:
+        if not await note_manager.get_note_by_id(note_id):
+            raise HTTPException(status_code=404, detail="Note not found")
         raise HTTPException(status_code=404, detail="No file for this note")
-    file_name = row[6] or "attachment"
-    file_bytes = row[7]
-    return StreamingResponse(iter([file_bytes]), media_type="application/octet-stream", headers={
-        "Content-Disposition": f"attachment; filename=\"{file_name}\""
-    })
-
-@app.put("/notes/{note_id}")
-def update_note(note_id: int, content: str, user_id: int):
-    note = note_manager.get_note_by_id(note_id)
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    if note["user_id"] != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to update this note")
-    result = note_manager.update_note(note_id, content)
+    file_name = attachment["file_name"]
+    file_size = attachment["file_size"]
+    etag = f"\"{attachment['file_hash']}\""
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    byte_range = None
+    if request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(request.headers.get("range"), file_size)
+    if byte_range:
+        first, last = byte_range
+        headers["Content-Disposition"] = _content_disposition(file_name)
+        headers["Content-Range"] = f"bytes {first}-{last}/{file_size}"
+        headers["Content-Length"] = str(last - first + 1)
+        return StreamingResponse(storage.iter_file(attachment["path"], first, last), status_code=206,
+                                 media_type="application/octet-stream", headers=headers)
+    return FileResponse(attachment["path"], media_type="application/octet-stream", headers=headers, filename=file_name)
+
+def _expected_version(if_match):
+    # If-Match carries an ETag from GET /notes/{id} ("<version>-<digest>") or a
+    # bare version; the UPDATE only applies while the note is at that version.
+    # Without the header (or with "*") the update is unconditional.
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.split(",")[0].strip().removeprefix("W/").strip('"')
+    try:
+        return int(tag.split("-")[0])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed If-Match header")
+
+def _write_failed(result):
+    # A 412 carries the same ETag GET /notes/{id} would return now, so the
+    # client can refetch or retry against the current version
+    headers = {"ETag": _serialize_note(result["note"])[1]} if "note" in result else None
+    return HTTPException(status_code=result.get("Status", 400), detail=result.get("Message"), headers=headers)
+
+# Ownership and the If-Match version are checked by the UPDATE/DELETE statement itself
+@router.put("/notes/{note_id}")
+async def update_note(
+    note_id: int,
+    content: str,
+    user_id: int = Depends(current_user_id),
+    if_match: str | None = Header(default=None)
+):
+    result = await note_manager.update_note(note_id, content, user_id, _expected_version(if_match))
     if not result.get("Success"):
-        raise HTTPException(status_code=400, detail=result.get("Message"))
+        raise _write_failed(result)
     return {"success": True, "data": result["data"]}
 
-@app.put("/notes/{note_id}/qr")
-def update_note_qr(note_id: int, qr_code_data: str):
-    result = note_manager.update_qr_data(note_id, qr_code_data)
+# Earlier versions, newest first; pass next_cursor back as before
+@router.get("/notes/{note_id}/revisions")
+async def list_note_revisions(
+    note_id: int,
+    before: int | None = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    result = await note_manager.list_revisions(note_id, before, limit)
     if not result.get("Success"):
-        raise HTTPException(status_code=400, detail=result.get("Message"))
+        raise HTTPException(status_code=result.get("Status", 400), detail=result.get("Message"))
+    return {"success": True, "data": result["data"], "current_version": result["current_version"],
+            "next_cursor": result["next_cursor"]}
+
+@router.get("/notes/{note_id}/revisions/{version}")
+async def get_note_revision(note_id: int, version: int):
+    result = await note_manager.get_revision(note_id, version)
+    if not result.get("Success"):
+        raise HTTPException(status_code=result.get("Status", 400), detail=result.get("Message"))
+    # A past version never changes
+    headers = {"Cache-Control": "private, max-age=31536000, immutable"}
+    return ORJSONResponse({"success": True, "data": result["data"]}, headers=headers)
+
+# Rolls back by writing the old text as a new version, so the restore can itself be undone
+@router.post("/notes/{note_id}/revisions/{version}/restore")
+async def restore_note_revision(
+    note_id: int,
+    version: int,
+    user_id: int = Depends(current_user_id),
+    if_match: str | None = Header(default=None)
+):
+    result = await note_manager.restore_note(note_id, version, user_id, _expected_version(if_match))
+    if not result.get("Success"):
+        raise _write_failed(result)
     return {"success": True, "data": result["data"]}
 
-@app.delete("/notes/{note_id}")
-def delete_note(note_id: int, user_id: int):
-    note = note_manager.get_note_by_id(note_id)
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    if note["user_id"] != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this note")
-    result = note_manager.delete_note(note_id)
+# Stores qr_code_data for clients; the QR image always encodes the view URL
+@router.put("/notes/{note_id}/qr")
+async def update_note_qr(note_id: int, qr_code_data: str):
+    result = await note_manager.update_qr_data(note_id, qr_code_data)
     if not result.get("Success"):
-        raise HTTPException(status_code=400, detail=result.get("Message"))
+        raise HTTPException(status_code=result.get("Status", 400), detail=result.get("Message"))
+    return {"success": True, "data": result["data"]}
+
+@router.delete("/notes/{note_id}")
+async def delete_note(note_id: int, user_id: int = Depends(current_user_id)):
+    result = await note_manager.delete_note(note_id, user_id)
+    if not result.get("Success"):
+        raise HTTPException(status_code=result.get("Status", 400), detail=result.get("Message"))
     return {"success": True, "data": result["data"]}
 
-@app.get("/")
-def root():
-    return {"message": "STUDYQR API is running!", "routes": ["/register", "/login", "/users", "/notes", "/notes/user/{user_id}", "/notes/{note_id}", "/notes/view/{note_id}", "/notes/download/{note_id}"]}
+@router.get("/cache/stats")
+async def cache_stats():
+    return {"success": True, "data": cache.stats()}
+
+# Prometheus text format; see src/metrics.py
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Collapsed stacks from sampling every thread for a while (STUDYQR_PROFILER=1 only)
+@router.get("/debug/profile", response_class=PlainTextResponse)
+async def get_profile(
+    seconds: float = Query(10, gt=0, le=profiler.MAX_SECONDS),
+    interval: float = Query(0.005, ge=0.001, le=1)
+):
+    if not profiler.ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled")
+    try:
+        stacks = await asyncio.to_thread(profiler.sample, seconds, interval)
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(stacks)
+
+@router.get("/")
+async def root():
+    return {"message": "STUDYQR API is running!", "routes": ["/register", "/login", "/users", "/users/summary", "/notes", "/notes/user/{user_id}", "/notes/{note_id}", "/notes/search", "/notes/view/{note_id}", "/notes/download/{note_id}", "/notes/{note_id}/qr.png", "/notes/{note_id}/qr.svg", "/notes/{note_id}/revisions"]}
+
+# ----------------- Application -----------------
+def create_app():
+    """Build the API app; also usable as ``uvicorn --factory API.main:create_app``."""
+    application = FastAPI(title="STUDYQR API", version="1.0", lifespan=lifespan)
+    # Allow CORS
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # Per-route latency and status counts for /metrics; added last so it times the whole stack
+    if metrics.ENABLED:
+        application.add_middleware(metrics.RequestMetrics)
+    application.include_router(router)
+    return application
+
+app = create_app()
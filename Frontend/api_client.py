@@ -0,0 +1,120 @@
+import os
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = "https://predatorily-hyperopic-kimber.ngrok-free.dev"  # Replace with your ngrok URL
+# Where the API publishes static note pages (src/publish.py), if it does
+STATIC_URL = os.getenv("STUDYQR_STATIC_URL", "").rstrip("/")
+
+# --- Shared HTTP client for the Streamlit pages ---
+# One keep-alive session per Streamlit server, so reruns reuse the TCP/TLS
+# connection to the API instead of reconnecting for every call. Reads are
+# memoized for a short time and dropped whenever this client writes.
+TIMEOUT = (3.05, 30)  # (connect, read) seconds
+CACHE_TTL = 60
+POOL_SIZE = 10
+
+class ApiError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+@st.cache_resource
+def _session():
+    # Only idempotent methods are retried; a POST might already have been applied
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "PUT", "DELETE"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _request(method, path, **kwargs):
+    try:
+        res = _session().request(method, f"{API_URL}{path}", timeout=TIMEOUT, **kwargs)
+    except requests.RequestException as e:
+        raise ApiError(f"Could not reach the API: {e}") from e
+    if res.status_code >= 400:
+        try:
+            detail = res.json().get("detail")
+        except ValueError:
+            detail = None
+        raise ApiError(detail or f"Request failed ({res.status_code})", res.status_code)
+    return res.json()
+
+def _invalidate():
+    get_user_notes.clear()
+    get_note.clear()
+    get_users_summary.clear()
+
+# --- Links the browser fetches itself (QR images, attachments) ---
+def note_url(note_id):
+    if STATIC_URL:
+        return f"{STATIC_URL}/n/{note_id}/"
+    return f"{API_URL}/notes/view/{note_id}"
+
+def qr_image_url(note_id):
+    return f"{API_URL}/notes/{note_id}/qr.png"
+
+def download_url(note_id):
+    return f"{API_URL}/notes/download/{note_id}"
+
+# --- Users ---
+def login(email, password):
+    return _request("POST", "/login", json={"email": email, "password": password})
+
+def register(user_name, email, password):
+    return _request("POST", "/register", json={"username": user_name, "email": email, "password": password})
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_users_summary(after_id=None, limit=20, notes_per_user=20):
+    return _request("GET", "/users/summary", params={
+        "after_id": after_id, "limit": limit, "notes_per_user": notes_per_user
+    })
+
+# --- Notes ---
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_user_notes(user_id, after_id=None, limit=20, order="desc"):
+    return _request("GET", f"/notes/user/{user_id}", params={"after_id": after_id, "limit": limit, "order": order})
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_note(note_id):
+    return _request("GET", f"/notes/{note_id}")["data"]
+
+def create_note(user_id, subject, content, uploaded_file=None):
+    # The UploadedFile is passed as a file object so requests streams it
+    files = {"file": (uploaded_file.name, uploaded_file)} if uploaded_file else None
+    data = {"subject": subject, "content": content, "user_id": user_id}
+    try:
+        return _request("POST", "/notes", data=data, files=files)["data"]
+    finally:
+        _invalidate()
+
+def _auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def update_note(note_id, token, content, version=None):
+    # With the version the note was loaded at, the API refuses (412) to
+    # overwrite an edit made elsewhere in the meantime
+    headers = _auth(token)
+    if version is not None:
+        headers["If-Match"] = f"\"{version}\""
+    try:
+        return _request("PUT", f"/notes/{note_id}", params={"content": content}, headers=headers)
+    finally:
+        _invalidate()
+
+def delete_note(note_id, token):
+    try:
+        return _request("DELETE", f"/notes/{note_id}", headers=_auth(token))
+    finally:
+        _invalidate()
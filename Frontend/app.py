@@ -1,9 +1,9 @@
 import streamlit as st
-import requests
-import qrcode
-from io import BytesIO
 
-API_URL = "https://predatorily-hyperopic-kimber.ngrok-free.dev"  # Replace with your ngrok URL
+import api_client as api
+from api_client import ApiError
+
+PAGE_SIZE = 20
 
 st.set_page_config(page_title="STUDYQR", layout="wide")
 
@@ -12,13 +12,29 @@ if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
     st.session_state.user_id = None
     st.session_state.user_name = None
-
-# ---------------- QR Code Generator ----------------
-def generate_qr_image(data):
-    qr_img = qrcode.make(data)
-    buf = BytesIO()
-    qr_img.save(buf, format="PNG")
-    return buf.getvalue()
+    st.session_state.token = None
+if "notes_cursor" not in st.session_state:
+    st.session_state.notes_cursor = None
+    st.session_state.users_cursor = None
+
+def pager(cursor_key, next_cursor):
+    # Keyset paging: the API hands back next_cursor, which becomes after_id
+    col_first, col_next = st.columns(2)
+    if st.session_state[cursor_key] is not None and col_first.button("⏮ First page", key=f"{cursor_key}_first"):
+        st.session_state[cursor_key] = None
+        st.rerun()
+    if next_cursor is not None and col_next.button("Next page ⏭", key=f"{cursor_key}_next"):
+        st.session_state[cursor_key] = next_cursor
+        st.rerun()
+
+# ---------------- Note Links ----------------
+# QR images and attachments are rendered and cached by the API; the browser
+# fetches them itself, only when shown or clicked
+def note_links(note_id, file_name=None, qr_width=150, key_prefix="link"):
+    st.image(api.qr_image_url(note_id), width=qr_width)
+    st.text_input("Link:", api.note_url(note_id), key=f"{key_prefix}_{note_id}")
+    if file_name:
+        st.link_button(f"Download File ({file_name})", api.download_url(note_id))
 
 # ---------------- Sidebar Menu ----------------
 menu = ["My Notes", "View Note by QR", "Admin: Users"] if st.session_state.logged_in else ["Home", "Login", "Register"]
@@ -38,19 +54,16 @@ elif choice == "Login":
         if st.form_submit_button("Login"):
             if email and password:
                 try:
-                    # Always use json= for FastAPI Pydantic models
-                    res = requests.post(f"{API_URL}/login", json={"email": email, "password": password})
-                    if res.status_code == 200:
-                        data = res.json()
-                        st.session_state.logged_in = True
-                        st.session_state.user_id = data["user_id"]
-                        st.session_state.user_name = data["user_name"]
-                        st.success(f"✅ Welcome {st.session_state.user_name}!")
-                        st.rerun()  # refresh sidebar immediately
-                    else:
-                        st.error(res.json().get("detail", "Login failed."))
-                except Exception as e:
-                    st.error(f"Error: {e}")
+                    data = api.login(email, password)
+                except ApiError as e:
+                    st.error(str(e) or "Login failed.")
+                else:
+                    st.session_state.logged_in = True
+                    st.session_state.user_id = data["user_id"]
+                    st.session_state.user_name = data["user_name"]
+                    st.session_state.token = data["token"]
+                    st.success(f"✅ Welcome {st.session_state.user_name}!")
+                    st.rerun()  # refresh sidebar immediately
             else:
                 st.warning("⚠ Please enter email and password.")
 
@@ -64,18 +77,12 @@ elif choice == "Register":
         if st.form_submit_button("Register"):
             if user_name and email and password:
                 try:
-                    res = requests.post(f"{API_URL}/register", json={
-                        "username": user_name,
-                        "email": email,
-                        "password": password
-                    })
-                    if res.status_code in [200, 201]:
-                        st.success("✅ Registration successful! Please login.")
-                        st.rerun()
-                    else:
-                        st.error(res.json().get("detail", "Registration failed."))
-                except Exception as e:
-                    st.error(f"Error: {e}")
+                    api.register(user_name, email, password)
+                except ApiError as e:
+                    st.error(str(e) or "Registration failed.")
+                else:
+                    st.success("✅ Registration successful! Please login.")
+                    st.rerun()
             else:
                 st.warning("⚠ Fill all fields!")
 
@@ -92,67 +99,57 @@ elif choice == "My Notes" and st.session_state.logged_in:
             if st.form_submit_button("Add Note & Generate QR"):
                 if subject and content:
                     try:
-                        files = {"file": (uploaded_file.name, uploaded_file.read())} if uploaded_file else None
-                        payload = {"subject": subject, "content": content, "user_id": st.session_state.user_id}
-                        res = requests.post(f"{API_URL}/notes", data=payload, files=files)
-                        if res.status_code in [200, 201]:
-                            note = res.json()["data"]
-                            note_id = note["Id"]
-                            st.success(f"✅ Note {note_id} added successfully!")
-                            note_url = f"{API_URL}/notes/view/{note_id}"
-                            st.image(generate_qr_image(note_url), width=200)
-                            st.text_input("Copy this link:", note_url, key=f"add_link_{note_id}")
-                        else:
-                            st.error(res.json().get("detail", "Failed to add note."))
-                    except Exception as e:
-                        st.error(f"Error: {e}")
+                        note = api.create_note(st.session_state.user_id, subject, content, uploaded_file)
+                    except ApiError as e:
+                        st.error(str(e) or "Failed to add note.")
+                    else:
+                        note_id = note["Id"]
+                        st.success(f"✅ Note {note_id} added successfully!")
+                        st.image(api.qr_image_url(note_id), width=200)
+                        st.text_input("Copy this link:", api.note_url(note_id), key=f"add_link_{note_id}")
                 else:
                     st.warning("⚠ Subject and content are required.")
 
     # --- Existing Notes ---
     st.subheader("Existing Notes")
     try:
-        res = requests.get(f"{API_URL}/notes/user/{st.session_state.user_id}")
-        if res.status_code == 200:
-            notes = res.json().get("data", [])
-            if notes:
-                for n in notes:
-                    note_id = n["Id"]
-                    st.markdown(f"*Note ID:* {note_id} | *Subject:* {n.get('subject','')}")
-                    st.code(n.get("content",""))
-
-                    note_url = f"{API_URL}/notes/view/{note_id}"
-                    st.image(generate_qr_image(note_url), width=150)
-                    st.text_input("Link:", note_url, key=f"link_{note_id}")
-
-                    # Download file if exists
-                    if n.get("file_name"):
-                        file_res = requests.get(f"{API_URL}/notes/download/{note_id}", stream=True)
-                        if file_res.status_code == 200:
-                            st.download_button(
-                                label=f"Download File ({n['file_name']})",
-                                data=file_res.content,
-                                file_name=n["file_name"]
-                            )
-
-                    # Edit / Delete
-                    with st.expander("Edit / Delete Note"):
-                        new_content = st.text_area("Update Content", value=n.get("content",""), key=f"edit_{note_id}")
+        page = api.get_user_notes(st.session_state.user_id, st.session_state.notes_cursor, PAGE_SIZE)
+    except ApiError as e:
+        st.error(f"Failed to fetch notes: {e}")
+    else:
+        notes = page.get("data", [])
+        if notes:
+            for n in notes:
+                note_id = n["Id"]
+                st.markdown(f"*Note ID:* {note_id} | *Subject:* {n.get('subject','')}")
+                st.code(n.get("content",""))
+                note_links(note_id, n.get("file_name"))
+
+                # Edit / Delete
+                with st.expander("Edit / Delete Note"):
+                    new_content = st.text_area("Update Content", value=n.get("content",""), key=f"edit_{note_id}")
+                    try:
                         if st.button("Update", key=f"update_{note_id}"):
-                            requests.put(f"{API_URL}/notes/{note_id}", params={"content": new_content, "user_id": st.session_state.user_id})
+                            api.update_note(note_id, st.session_state.token, new_content, n.get("version"))
                             st.success("✅ Note updated!")
                             st.rerun()
                         if st.button("Delete", key=f"delete_{note_id}"):
-                            requests.delete(f"{API_URL}/notes/{note_id}", params={"user_id": st.session_state.user_id})
+                            api.delete_note(note_id, st.session_state.token)
                             st.success("✅ Note deleted!")
                             st.rerun()
-                    st.markdown("---")
-            else:
-                st.info("No notes found.")
+                    except ApiError as e:
+                        if e.status_code == 412:
+                            # Edited in another tab or device since this page loaded
+                            st.warning("This note was changed elsewhere; reload to see the latest version.")
+                        else:
+                            if e.status_code == 401:
+                                # Session expired or the API's secret changed: log in again
+                                st.session_state.logged_in = False
+                            st.error(f"Error: {e}")
+                st.markdown("---")
+            pager("notes_cursor", page.get("next_cursor"))
         else:
-            st.error("Failed to fetch notes.")
-    except Exception as e:
-        st.error(f"Error: {e}")
+            st.info("No notes found.")
 
 # ---------------- View Note by QR ----------------
 elif choice == "View Note by QR":
@@ -160,45 +157,26 @@ elif choice == "View Note by QR":
     note_id_input = st.number_input("Note ID", min_value=1, step=1)
     if st.button("Fetch Note"):
         try:
-            res = requests.get(f"{API_URL}/notes/{note_id_input}")
-            if res.status_code == 200:
-                note = res.json().get("data", {})
-                st.markdown(f"*Subject:* {note.get('subject','')}")
-                st.code(note.get("content",""))
-
-                note_url = f"{API_URL}/notes/view/{note['Id']}"
-                st.image(generate_qr_image(note_url), width=200)
-                st.text_input("Link:", note_url, key=f"view_link_{note['Id']}")
-
-                if note.get("file_name"):
-                    file_res = requests.get(f"{API_URL}/notes/download/{note_id_input}", stream=True)
-                    if file_res.status_code == 200:
-                        st.download_button(
-                            label=f"Download File ({note['file_name']})",
-                            data=file_res.content,
-                            file_name=note["file_name"]
-                        )
-            else:
-                st.error("Note not found.")
-        except Exception as e:
-            st.error(f"Error: {e}")
+            note = api.get_note(int(note_id_input))
+        except ApiError as e:
+            st.error("Note not found." if e.status_code == 404 else f"Error: {e}")
+        else:
+            st.markdown(f"*Subject:* {note.get('subject','')}")
+            st.code(note.get("content",""))
+            note_links(note["Id"], note.get("file_name"), qr_width=200, key_prefix="view_link")
 
 # ---------------- Admin Users ----------------
 elif choice == "Admin: Users" and st.session_state.logged_in:
     st.subheader("👥 Admin Users Management")
+    # One request per page: users come back with their note counts and latest notes
     try:
-        res_users = requests.get(f"{API_URL}/users")
-        if res_users.status_code == 200:
-            users = res_users.json().get("data", [])
-            for u in users:
-                st.markdown(f"*User ID:* {u.get('Id')} | Name: {u.get('User_Name')} | Email: {u.get('email')}")
-                res_notes = requests.get(f"{API_URL}/notes/user/{u.get('Id')}")
-                if res_notes.status_code == 200:
-                    notes = res_notes.json().get("data", [])
-                    for n in notes:
-                        st.markdown(f"- Note ID: {n['Id']} | Subject: {n.get('subject','')}")
-                st.markdown("---")
-        else:
-            st.error("Failed to fetch users.")
-    except Exception as e:
-        st.error(f"Error: {e}")
+        page = api.get_users_summary(st.session_state.users_cursor, PAGE_SIZE, PAGE_SIZE)
+    except ApiError as e:
+        st.error(f"Failed to fetch users: {e}")
+    else:
+        for u in page.get("data", []):
+            st.markdown(f"*User ID:* {u.get('Id')} | Name: {u.get('User_Name')} | Email: {u.get('email')} | Notes: {u.get('note_count', 0)}")
+            for n in u.get("latest_notes", []):
+                st.markdown(f"- Note ID: {n['Id']} | Subject: {n.get('subject','')}")
+            st.markdown("---")
+        pager("users_cursor", page.get("next_cursor"))
@@ -0,0 +1,228 @@
+"""Benchmark the STUDYQR API end to end and record the results as JSON.
+
+    python bench/api.py [--mode inprocess|uvicorn|both] [--scenarios qr_scan,list,...]
+                        [--users 1000] [--notes 50000] [--attachment-kb 256]
+                        [--concurrency 32] [--duration 10] [--compare OLD.json]
+
+Seeds a throwaway database (users, notes and attachments of a chosen size),
+then runs each scenario against the app called in-process through ASGI (the
+app's own cost) and/or a local uvicorn server (the cost a client sees):
+
+    qr_scan   bursts of /notes/view scans concentrated on a few hot notes
+    list      newest-first pages of /notes/user/{id}
+    upload    POST /notes with an attachment of --attachment-kb
+    download  GET /notes/download/{id} of attachments
+    login     POST /login (bcrypt at STUDYQR_BCRYPT_ROUNDS)
+    mixed     all of the above, weighted like normal use
+
+Each scenario reports requests/sec, p50/p95/p99 latency, errors and bytes
+received; each mode reports peak RSS. Results are written to
+bench/results/<commit>-<time>.json. With --compare, rps and p99 are diffed
+against an earlier result file and the exit status is 1 if any scenario
+regressed by more than --threshold percent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import (ROOT, PASSWORD, AsgiConnection, AsgiLifespan, HttpConnection, bench_env, git_revision,
+                    peak_rss_mb, seed, start_uvicorn, summarize)
+
+SCENARIOS = ("qr_scan", "list", "upload", "download", "login", "mixed")
+MIXED_WEIGHTS = {"qr_scan": 50, "list": 25, "download": 10, "upload": 10, "login": 5}
+
+class Workload:
+    """Builds the next request for a scenario; one instance per client."""
+
+    def __init__(self, args, rng):
+        self.args = args
+        self.rng = rng
+        self.upload_body = os.urandom(args.attachment_kb * 1024)
+        # QR scans cluster on whatever was just shared: a small hot set of notes
+        self.hot_notes = [rng.randint(1, args.notes) for _ in range(20)]
+
+    def next(self, scenario):
+        if scenario == "mixed":
+            names, weights = zip(*MIXED_WEIGHTS.items())
+            scenario = self.rng.choices(names, weights)[0]
+        return getattr(self, scenario)()
+
+    def qr_scan(self):
+        if self.rng.random() < 0.9:
+            note_id = self.rng.choice(self.hot_notes)
+        else:
+            note_id = self.rng.randint(1, self.args.notes)
+        return "GET", f"/notes/view/{note_id}", b"", None
+
+    def list(self):
+        return "GET", f"/notes/user/{self.rng.randint(1, self.args.users)}?limit=20&order=desc", b"", None
+
+    def upload(self):
+        boundary = uuid.uuid4().hex
+        user_id = self.rng.randint(1, self.args.users)
+        parts = []
+        for name, value in (("content", "benchmark upload"), ("subject", "Physics"), ("user_id", str(user_id))):
+            parts.append(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode())
+        parts.append(f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"upload.bin\"\r\n"
+                     f"Content-Type: application/octet-stream\r\n\r\n".encode() + self.upload_body + b"\r\n")
+        parts.append(f"--{boundary}--\r\n".encode())
+        return "POST", "/notes", b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+    def download(self):
+        # Seeded notes 1, 1 + every, 1 + 2*every, ... carry attachments (Id = i + 1)
+        every = self.args.attachment_every
+        note_id = self.rng.randrange(0, self.args.notes, every) + 1
+        return "GET", f"/notes/download/{note_id}", b"", None
+
+    def login(self):
+        user = self.rng.randrange(self.args.users)
+        body = json.dumps({"email": f"user{user}@example.com", "password": PASSWORD}).encode("utf-8")
+        return "POST", "/login", body, "application/json"
+
+async def _client(connection, workload, scenario, stop_at, stats):
+    try:
+        while time.monotonic() < stop_at:
+            request = workload.next(scenario)
+            started = time.perf_counter()
+            status, received = await connection.request(*request)
+            stats["latencies"].append(time.perf_counter() - started)
+            stats["bytes"] += received
+            if status >= 400 and status != 503:
+                stats["errors"] += 1
+            elif status == 503:
+                stats["rejected"] += 1
+    finally:
+        await connection.close()
+
+async def run_scenario(make_connection, scenario, args):
+    warm = {"latencies": [], "bytes": 0, "errors": 0, "rejected": 0}
+    warm_until = time.monotonic() + args.warmup
+    await asyncio.gather(*(_client(make_connection(), Workload(args, random.Random(i)), scenario, warm_until, warm)
+                           for i in range(args.concurrency)))
+    stats = {"latencies": [], "bytes": 0, "errors": 0, "rejected": 0}
+    started = time.monotonic()
+    await asyncio.gather(*(_client(make_connection(), Workload(args, random.Random(1000 + i)), scenario,
+                                   started + args.duration, stats)
+                           for i in range(args.concurrency)))
+    result = summarize(stats["latencies"], time.monotonic() - started, stats["errors"])
+    result["rejected_503"] = stats["rejected"]
+    result["mb_received"] = round(stats["bytes"] / 2 ** 20, 1)
+    return result
+
+def _print(mode, scenario, result):
+    p = lambda key: "-" if result[key] is None else f"{result[key]:.2f}"
+    print(f"{mode:>9} {scenario:>9}  {result['rps']:>8.0f} req/s  p50 {p('p50_ms'):>6} ms  "
+          f"p95 {p('p95_ms'):>6} ms  p99 {p('p99_ms'):>6} ms  errors {result['errors']}")
+
+def run_inprocess(workdir, args):
+    # The app reads its configuration at import, so point it at the seeded workdir first
+    os.environ.update(bench_env(workdir))
+    sys.path.insert(0, ROOT)
+    from API.main import app
+
+    async def main():
+        results = {}
+        async with AsgiLifespan(app):
+            for scenario in args.scenarios:
+                results[scenario] = await run_scenario(lambda: AsgiConnection(app), scenario, args)
+                _print("inprocess", scenario, results[scenario])
+        return results
+
+    results = asyncio.run(main())
+    return {"scenarios": results, "peak_rss_mb": peak_rss_mb()}
+
+def run_uvicorn(workdir, args):
+    proc, port = start_uvicorn(workdir, workers=args.workers)
+    try:
+        results = {}
+        for scenario in args.scenarios:
+            results[scenario] = asyncio.run(run_scenario(lambda: HttpConnection(port), scenario, args))
+            _print("uvicorn", scenario, results[scenario])
+        rss = peak_rss_mb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {"scenarios": results, "peak_rss_mb": rss, "workers": args.workers}
+
+def compare(old_path, new, threshold):
+    with open(old_path) as f:
+        old = json.load(f)
+    print(f"\nagainst {old_path} ({(old.get('commit') or '?')[:10]}):")
+    regressed = False
+    for mode, run in new["modes"].items():
+        old_run = old["modes"].get(mode)
+        if not old_run:
+            continue
+        for scenario, result in run["scenarios"].items():
+            before = old_run["scenarios"].get(scenario)
+            if not before or not before["rps"] or before["p99_ms"] is None or result["p99_ms"] is None:
+                continue
+            rps = (result["rps"] - before["rps"]) / before["rps"] * 100
+            p99 = (result["p99_ms"] - before["p99_ms"]) / before["p99_ms"] * 100
+            worse = rps < -threshold or p99 > threshold
+            regressed |= worse
+            print(f"{mode:>9} {scenario:>9}  rps {rps:+6.1f}%  p99 {p99:+6.1f}%{'  REGRESSION' if worse else ''}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn", "both"), default="both")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--notes", type=int, default=50000)
+    parser.add_argument("--attachment-kb", type=int, default=256)
+    parser.add_argument("--attachment-every", type=int, default=10, help="every Nth seeded note has an attachment")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds before each scenario")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="result file (default bench/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="diff against an earlier result file")
+    parser.add_argument("--threshold", type=float, default=10, help="regression threshold in percent")
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    commit, dirty = git_revision()
+    result = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "threshold")},
+        "modes": {},
+    }
+    # The uvicorn run goes first: the in-process run imports the app into this process
+    if args.mode in ("uvicorn", "both"):
+        workdir = tempfile.mkdtemp(prefix="studyqr-bench-")
+        seed(workdir, args.users, args.notes, args.attachment_kb, args.attachment_every, args.seed)
+        result["modes"]["uvicorn"] = run_uvicorn(workdir, args)
+    if args.mode in ("inprocess", "both"):
+        workdir = tempfile.mkdtemp(prefix="studyqr-bench-")
+        seed(workdir, args.users, args.notes, args.attachment_kb, args.attachment_every, args.seed)
+        result["modes"]["inprocess"] = run_inprocess(workdir, args)
+
+    output = args.output or os.path.join(ROOT, "bench", "results",
+                                         f"{(commit or 'unknown')[:10]}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nwrote {output}")
+    if args.compare and compare(args.compare, result, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Helpers shared by the benchmark scripts: seeding, servers, clients, stats."""
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SUBJECTS = ["Mathematics", "Physics", "Chemistry", "Biology", "History", "Geography", "Economics", "Literature"]
+PASSWORD = "bench-password"
+SESSION_SECRET = "bench-session-secret"
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def summarize(latencies, elapsed, errors=0):
+    if not latencies:
+        return {"requests": 0, "rps": 0.0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "errors": errors}
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "errors": errors,
+    }
+
+def bench_env(workdir, **extra):
+    """Environment pointing every STUDYQR_* path at ``workdir``."""
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT,
+        "STUDYQR_DB_PATH": os.path.join(workdir, "bench.db"),
+        "STUDYQR_ATTACHMENT_DIR": os.path.join(workdir, "attachments"),
+        "STUDYQR_QR_CACHE_DIR": os.path.join(workdir, "qr_cache"),
+        "STUDYQR_INGEST_WORKERS": "0",
+        "STUDYQR_SESSION_SECRET": SESSION_SECRET,
+    })
+    env.update({key: str(value) for key, value in extra.items()})
+    return env
+
+def seed(workdir, users, notes, attachment_kb=0, attachment_every=10, seed=1):
+    """Fill a fresh database in ``workdir``, in a subprocess so it sees ``bench_env``.
+
+    Every user's password is PASSWORD. Note ``i`` belongs to user ``i % users + 1``;
+    every ``attachment_every``-th note gets an attachment of ``attachment_kb`` KiB.
+    """
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "bench", "common.py"), "seed", workdir,
+         str(users), str(notes), str(attachment_kb), str(attachment_every), str(seed)],
+        cwd=ROOT, env=bench_env(workdir), check=True
+    )
+
+def _seed_in_process(users, notes, attachment_kb, attachment_every, seed):
+    import bcrypt
+    from src import db, storage
+
+    db.init_db()
+    rng = random.Random(seed)
+    password_hash = bcrypt.hashpw(PASSWORD.encode("utf-8"),
+                                  bcrypt.gensalt(int(os.getenv("STUDYQR_BCRYPT_ROUNDS", "12")))).decode("utf-8")
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users (User_Name, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+            ((f"user{i}", f"user{i}@example.com", password_hash, "2024-01-01") for i in range(users))
+        )
+    # A handful of distinct attachments; the store deduplicates identical files
+    attachments = [storage.save(os.urandom(attachment_kb * 1024)) for _ in range(8)] if attachment_kb else []
+    batch = 20000
+    for start in range(0, notes, batch):
+        rows = []
+        for i in range(start, min(start + batch, notes)):
+            file_hash = file_size = file_name = None
+            if attachments and i % attachment_every == 0:
+                file_hash, file_size = attachments[i % len(attachments)]
+                file_name = f"attachment{i}.bin"
+            rows.append((f"note {i} " + " ".join(rng.choice(SUBJECTS).lower() for _ in range(30)), "",
+                         i % users + 1, rng.choice(SUBJECTS), f"2024-01-01 {i:09d}", file_name, file_hash, file_size))
+        with db.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO notes (content, qr_code_data, user_id, subject, created_at, file_name, file_hash, file_size)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+def session_token(user_id):
+    """A session token the benchmarked API (which shares SESSION_SECRET) accepts for ``user_id``."""
+    os.environ["STUDYQR_SESSION_SECRET"] = SESSION_SECRET
+    sys.path.insert(0, ROOT)
+    from src import sessions
+    return sessions.issue(user_id, f"user{user_id - 1}")[0]
+
+def git_revision(cwd=ROOT):
+    try:
+        rev = subprocess.run(["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True, text=True, check=True).stdout
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd,
+                               capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return rev.strip(), bool(dirty.strip())
+
+def peak_rss_mb(pid=None):
+    """Peak resident set size of ``pid`` (default: this process) in MiB."""
+    path = f"/proc/{pid or 'self'}/status"
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid is None:
+        import resource
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return None
+
+# --- uvicorn ---
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_uvicorn(workdir, app_root=ROOT, workers=1, **extra_env):
+    port = _free_port()
+    env = bench_env(workdir, **extra_env)
+    env["PYTHONPATH"] = app_root
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "API.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=app_root, env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+            return proc, port
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("uvicorn did not start within 30s")
+
+class HttpConnection:
+    """Minimal keep-alive HTTP/1.1 client; enough for Content-Length and chunked replies."""
+
+    def __init__(self, port):
+        self.port = port
+        self._reader = self._writer = None
+
+    async def request(self, method, path, body=b"", content_type=None, headers=None):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection("127.0.0.1", self.port)
+        head = f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(body)}\r\n"
+        if content_type:
+            head += f"Content-Type: {content_type}\r\n"
+        for name, value in (headers or {}).items():
+            head += f"{name}: {value}\r\n"
+        self._writer.write(head.encode("ascii") + b"\r\n" + body)
+        await self._writer.drain()
+        status = int((await self._reader.readline()).split()[1])
+        length, chunked = 0, False
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "transfer-encoding" and "chunked" in value.lower():
+                chunked = True
+        received = 0
+        if chunked:
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                await self._reader.readexactly(size + 2)
+                received += size
+                if size == 0:
+                    break
+        else:
+            await self._reader.readexactly(length)
+            received = length
+        return status, received
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+# --- In-process ASGI ---
+class AsgiConnection:
+    """Calls an ASGI app directly, without sockets, to time the app alone."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, body=b"", content_type=None, headers=None):
+        path, _, query = path.partition("?")
+        extra = headers or {}
+        headers = [(b"host", b"bench"), (b"content-length", str(len(body)).encode("ascii"))]
+        if content_type:
+            headers.append((b"content-type", content_type.encode("ascii")))
+        headers.extend((name.lower().encode("ascii"), value.encode("latin-1")) for name, value in extra.items())
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+            "scheme": "http", "path": path, "raw_path": path.encode("ascii"), "query_string": query.encode("ascii"),
+            "root_path": "", "headers": headers, "client": ("127.0.0.1", 1), "server": ("bench", 80),
+        }
+        sent = False
+        status, received = None, 0
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # no disconnect until the response is done
+
+        async def send(message):
+            nonlocal status, received
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                received += len(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, received
+
+    async def close(self):
+        pass
+
+class AsgiLifespan:
+    """Runs an ASGI app's startup and shutdown as a server would."""
+
+    def __init__(self, app):
+        self.app = app
+        self._events = asyncio.Queue()
+        self._replies = asyncio.Queue()
+        self._task = None
+
+    async def _receive(self):
+        return await self._events.get()
+
+    async def _send(self, message):
+        await self._replies.put(message)
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self.app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}},
+                                                  self._receive, self._send))
+        await self._events.put({"type": "lifespan.startup"})
+        message = await self._replies.get()
+        if message["type"] != "lifespan.startup.complete":
+            raise RuntimeError(f"App startup failed: {message.get('message')}")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._events.put({"type": "lifespan.shutdown"})
+        await self._replies.get()
+        await self._task
+
+if __name__ == "__main__" and sys.argv[1:2] == ["seed"]:
+    sys.path.insert(0, ROOT)
+    workdir, *counts = sys.argv[2:]
+    _seed_in_process(*map(int, counts))
@@ -0,0 +1,155 @@
+"""Track cold-start cost: module import time and time to the first response.
+
+    python bench/importtime.py [--targets API.main,src.logic,api_client] [--runs 7]
+                               [--top 15] [--compare OLD.json] [--threshold 20]
+
+Each target is imported in a fresh interpreter under ``python -X importtime``
+(--runs times; the median is reported) and the slowest modules it pulls in
+are listed by cumulative time. Modules that should only load on the routes
+that need them (bcrypt, qrcode, PIL, pypdfium2) are flagged if an import
+brings them in. For API.main, "startup" additionally times a fresh process
+through import, create_app(), the lifespan startup (schema setup) and a
+first GET /, in-process over ASGI.
+
+Results are written to bench/results/importtime-<commit>-<time>.json; with
+--compare the exit status is 1 if a target got more than --threshold percent
+slower than in an earlier result file.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, bench_env, git_revision
+
+HEAVY_MODULES = ("bcrypt", "qrcode", "PIL", "pypdfium2")
+# Where each target is importable from; api_client lives next to the Streamlit app
+TARGET_PATHS = {"api_client": os.path.join(ROOT, "Frontend")}
+
+STARTUP_SCRIPT = """
+import asyncio, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {bench!r})
+from API.main import create_app
+from common import AsgiConnection, AsgiLifespan
+imported = time.perf_counter()
+
+async def main():
+    app = create_app()
+    async with AsgiLifespan(app):
+        ready = time.perf_counter()
+        status, _ = await AsgiConnection(app).request("GET", "/")
+        assert status == 200, status
+        return ready
+
+ready = asyncio.run(main())
+print(imported - started, ready - started, time.perf_counter() - started)
+"""
+
+def _parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package", nesting shown by indentation
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+def measure_import(target, workdir, runs):
+    env = bench_env(workdir)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [TARGET_PATHS.get(target), ROOT]))
+    totals, last = [], {}
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"],
+                              cwd=workdir, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1]}
+        last = _parse_importtime(proc.stderr)
+        totals.append(last[target][1] / 1000)
+    return {
+        "import_ms": round(statistics.median(totals), 2),
+        "modules": len(last),
+        "heavy_modules": sorted(name for name in last if name.split(".")[0] in HEAVY_MODULES),
+        "slowest": [(name, round(cumulative / 1000, 2)) for name, (_, cumulative)
+                    in sorted(last.items(), key=lambda item: -item[1][1]) if name != target],
+    }
+
+def measure_startup(workdir, runs):
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT.format(bench=os.path.join(ROOT, "bench"))],
+            cwd=workdir, env=bench_env(workdir), capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1]}
+        samples.append([float(value) * 1000 for value in proc.stdout.split()])
+    imported, ready, first_response = (round(statistics.median(column), 2) for column in zip(*samples))
+    return {"import_ms": imported, "ready_ms": ready, "first_response_ms": first_response}
+
+def compare(old_path, new, threshold):
+    with open(old_path) as f:
+        old = json.load(f)
+    print(f"\nagainst {old_path} ({(old.get('commit') or '?')[:10]}):")
+    regressed = False
+    for target, result in new["targets"].items():
+        before = old["targets"].get(target, {})
+        if "import_ms" not in before or "import_ms" not in result:
+            continue
+        change = (result["import_ms"] - before["import_ms"]) / before["import_ms"] * 100
+        worse = change > threshold
+        regressed |= worse
+        print(f"{target:>12}  import {change:+6.1f}%{'  REGRESSION' if worse else ''}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", default="API.main,src.logic,api_client")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list per target")
+    parser.add_argument("--output", help="result file (default bench/results/importtime-<commit>-<time>.json)")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="diff against an earlier result file")
+    parser.add_argument("--threshold", type=float, default=20, help="regression threshold in percent")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="studyqr-importtime-")
+    commit, dirty = git_revision()
+    result = {"commit": commit, "dirty": dirty, "python": sys.version.split()[0], "runs": args.runs, "targets": {}}
+    for target in [t for t in args.targets.split(",") if t]:
+        measured = measure_import(target, workdir, args.runs)
+        if target == "API.main" and "error" not in measured:
+            measured["startup"] = measure_startup(workdir, args.runs)
+        measured["slowest"] = measured.get("slowest", [])[:args.top]
+        result["targets"][target] = measured
+        if "error" in measured:
+            print(f"{target:>12}  skipped: {measured['error']}")
+            continue
+        print(f"{target:>12}  {measured['import_ms']:8.2f} ms  {measured['modules']} modules"
+              + (f"  HEAVY: {', '.join(measured['heavy_modules'])}" if measured["heavy_modules"] else ""))
+        startup = measured.get("startup", {})
+        if "ready_ms" in startup:
+            print(f"{'':>12}  startup: import {startup['import_ms']:.1f} ms, ready {startup['ready_ms']:.1f} ms, "
+                  f"first response {startup['first_response_ms']:.1f} ms")
+        for name, cumulative in measured["slowest"]:
+            print(f"{'':>14}{cumulative:8.2f} ms  {name}")
+
+    path = args.output
+    if not path:
+        os.makedirs(os.path.join(ROOT, "bench", "results"), exist_ok=True)
+        name = f"importtime-{(commit or 'unknown')[:10]}-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:4]}.json"
+        path = os.path.join(ROOT, "bench", "results", name)
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nwrote {path}")
+    if args.compare and compare(args.compare, result, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Mixed read/write load test against a real uvicorn server.
+
+    python bench/load.py [--concurrency 64] [--duration 20] [--writes 0.2] [--baseline REV]
+
+Seeds a throwaway database, starts ``uvicorn API.main:app`` on it and drives
+it from keep-alive connections: note reads, user note pages and (with
+probability --writes) note creates and updates. Reports requests/sec and
+p50/p95/p99 latency. With --baseline, the same load is first run against the
+API as of git revision REV (checked out into a temporary worktree), so the
+two results can be compared on one machine.
+
+Recorded results, sync endpoints (eceabea) against async endpoints over the
+reader/writer database layer (fc8fb5c), using this script as of fc8fb5c with
+--duration 15 --users 200 --notes 20000 --concurrency 64, on one CPU shared
+by server and load generator:
+
+    writes  revision         req/s  p50 ms  p95 ms  p99 ms  errors
+    0.2     eceabea (sync)     664    96.0   121.3   147.2       0
+    0.2     fc8fb5c (async)    827    73.3   110.6   130.0       0
+    0.5     eceabea (sync)     641    99.4   131.4   148.9       0
+    0.5     fc8fb5c (async)    833    70.5   107.3   129.5       0
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, HttpConnection, seed, session_token, start_uvicorn, summarize
+
+async def _client(port, args, stop_at, latencies, errors, rng, tokens):
+    connection = HttpConnection(port)
+    try:
+        while time.monotonic() < stop_at:
+            user_id = rng.randint(1, args.users)
+            roll = rng.random()
+            if roll < args.writes / 2:
+                form = urllib.parse.urlencode({"content": "load test note", "subject": "Load", "user_id": user_id})
+                request = ("POST", "/notes", form.encode("ascii"), "application/x-www-form-urlencoded")
+            elif roll < args.writes:
+                # Seeded note i + 1 belongs to user i % users + 1
+                note_id = rng.randrange(user_id, args.notes + 1, args.users)
+                # user_id is for --baseline revisions from before session tokens
+                query = urllib.parse.urlencode({"content": f"edited {rng.random()}", "user_id": user_id})
+                request = ("PUT", f"/notes/{note_id}?{query}", b"", None, {"Authorization": f"Bearer {tokens[user_id]}"})
+            elif roll < args.writes + (1 - args.writes) * 0.8:
+                request = ("GET", f"/notes/{rng.randint(1, args.notes)}", b"", None)
+            else:
+                request = ("GET", f"/notes/user/{user_id}?limit=20&order=desc", b"", None)
+            started = time.perf_counter()
+            status, _ = await connection.request(*request)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        await connection.close()
+
+async def drive(port, args):
+    latencies, errors = [], []
+    tokens = {user_id: session_token(user_id) for user_id in range(1, args.users + 1)}
+    # Warm up connections and caches before measuring
+    warm_until = time.monotonic() + 2
+    await asyncio.gather(*(_client(port, args, warm_until, [], [], random.Random(i), tokens) for i in range(args.concurrency)))
+    started = time.monotonic()
+    stop_at = started + args.duration
+    await asyncio.gather(*(_client(port, args, stop_at, latencies, errors, random.Random(1000 + i), tokens)
+                           for i in range(args.concurrency)))
+    return summarize(latencies, time.monotonic() - started, len(errors))
+
+def run(label, app_root, args):
+    workdir = tempfile.mkdtemp(prefix="studyqr-load-")
+    seed(workdir, args.users, args.notes)
+    proc, port = start_uvicorn(workdir, app_root)
+    try:
+        result = asyncio.run(drive(port, args))
+    finally:
+        proc.terminate()
+        proc.wait()
+    print(f"{label:>10}  {result['requests']:>8} req  {result['rps']:>8.0f} req/s  "
+          f"p50 {result['p50_ms']:6.1f} ms  p95 {result['p95_ms']:6.1f} ms  p99 {result['p99_ms']:6.1f} ms  "
+          f"errors {result['errors']}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--writes", type=float, default=0.2, help="fraction of requests that write")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--notes", type=int, default=50000)
+    parser.add_argument("--baseline", metavar="REV", help="also load-test the API at this git revision")
+    args = parser.parse_args()
+
+    if args.baseline:
+        worktree = tempfile.mkdtemp(prefix="studyqr-baseline-")
+        subprocess.run(["git", "worktree", "add", "--detach", worktree, args.baseline], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL)
+        try:
+            run(args.baseline[:10], worktree, args)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=ROOT, check=True)
+    run("current", ROOT, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Check that the hot queries in src/db.py are served by indexes.
+
+Seeds a throwaway database, runs EXPLAIN QUERY PLAN on each query and exits
+non-zero if any of them falls back to a full table scan. Also times each query
+so regressions show up as numbers, not just plan changes.
+
+    python bench/query_plans.py [--notes 50000] [--users 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+def hot_queries(db):
+    page_sql, page_params = db._page_query("notes", db.models.Note, "user_id=?", (7,),
+                                           ("created_at",), 3507, 50, True)
+    return {
+        "notes by user": (f"SELECT {db.NOTE_COLUMNS} FROM notes WHERE user_id=?", (7,)),
+        "notes page": (page_sql, tuple(page_params)),
+        "note by id": (f"SELECT {db.NOTE_COLUMNS} FROM notes WHERE Id=?", (42,)),
+        "user by email": ("SELECT * FROM users WHERE email=?", ("user7@example.com",)),
+        "shared attachment": ("SELECT 1 FROM notes WHERE file_hash=? LIMIT 1", ("0" * 64,)),
+    }
+
+def seed(db, users, notes):
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users (User_Name, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+            ((f"user{i}", f"user{i}@example.com", "x", "2024-01-01") for i in range(users))
+        )
+        conn.executemany(
+            "INSERT INTO notes (content, qr_code_data, user_id, subject, created_at) VALUES (?, ?, ?, ?, ?)",
+            ((f"note {i}", "", i % users + 1, "subject", f"2024-01-01 00:00:{i:06d}") for i in range(notes))
+        )
+        conn.execute("ANALYZE")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--notes", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="studyqr-bench-")
+    os.environ["STUDYQR_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["STUDYQR_ATTACHMENT_DIR"] = os.path.join(workdir, "attachments")
+    from src import db
+
+    db.init_db()
+    seed(db, args.users, args.notes)
+    failures = []
+    with db.get_connection() as conn:
+        for name, (sql, params) in hot_queries(db).items():
+            plan = " | ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                conn.execute(sql, params).fetchall()
+            per_query_us = (time.perf_counter() - start) / args.repeat * 1e6
+            scans = [step for step in plan.split(" | ") if step.startswith("SCAN")]
+            status = "FAIL" if scans else "ok"
+            if scans:
+                failures.append(name)
+            print(f"{status:4} {name:18} {per_query_us:9.1f} us  {plan}")
+    if failures:
+        print(f"full table scans in: {', '.join(failures)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Measure how note revision history grows with the number of edits.
+
+    python bench/revisions.py [--edits 1000] [--lines 200] [--words 400]
+                              [--shapes lines,paragraph] [--checkpoints 10,100,1000]
+
+For each shape, creates one note and applies --edits random edits through
+db.update_note_db:
+
+    lines      a note of --lines lines; each edit replaces, inserts or
+               deletes one line
+    paragraph  a single line of --words words, as typed into the Streamlit
+               text area; each edit replaces, inserts or deletes one word
+
+At each checkpoint it reports the bytes stored in note_revisions against
+what keeping a full copy per version would take, the median update time
+since the previous checkpoint, and the time to rebuild the oldest version
+(the worst case: the longest delta chain down from a snapshot).
+
+Revision storage should grow by roughly one small delta per edit plus one
+full copy every STUDYQR_REVISION_SNAPSHOT_EVERY versions, so the ratio to
+full copies stays around 1 / SNAPSHOT_EVERY however many edits there are.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+WORDS = ("cell", "energy", "vector", "matrix", "protein", "orbit", "theorem", "market", "enzyme", "signal")
+
+def random_line(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14))) + "\n"
+
+def edit_parts(rng, parts, new_part):
+    i = rng.randrange(len(parts))
+    op = rng.random()
+    if op < 0.6 or len(parts) < 2:
+        parts[i] = new_part()
+    elif op < 0.8:
+        parts.insert(i, new_part())
+    else:
+        del parts[i]
+    return parts
+
+SHAPES = {
+    # (initial text, edit) for each note shape
+    "lines": (
+        lambda rng, args: "".join(random_line(rng) for _ in range(args.lines)),
+        lambda rng, text: "".join(edit_parts(rng, text.splitlines(keepends=True), lambda: random_line(rng))),
+    ),
+    "paragraph": (
+        lambda rng, args: " ".join(rng.choice(WORDS) for _ in range(args.words)) + ".",
+        lambda rng, text: " ".join(edit_parts(rng, text.split(" "), lambda: rng.choice(WORDS))),
+    ),
+}
+
+def run(db, revisions, shape, args, checkpoints):
+    make_text, edit = SHAPES[shape]
+    rng = random.Random(args.seed)
+    text = make_text(rng, args)
+    note, error = db.add_note_db(text, "", 1, "Physics", "2024-01-01 00:00:00")
+    if error:
+        sys.exit(error)
+
+    print(f"\n{shape}: {text.count(chr(10)) + 1} line(s), {len(text.encode('utf-8')) / 1024:.1f} KiB, "
+          f"snapshot every {revisions.SNAPSHOT_EVERY} versions")
+    print(f"{'edits':>6}  {'revisions':>10}  {'full copies':>11}  {'ratio':>6}  {'update':>9}  {'oldest':>9}")
+    full_copies = 0
+    update_times = []
+    for done in range(1, args.edits + 1):
+        full_copies += len(text.encode("utf-8"))
+        text = edit(rng, text)
+        started = time.perf_counter()
+        _, error = db.update_note_db(note.Id, text, expected_version=done)
+        update_times.append(time.perf_counter() - started)
+        if error:
+            sys.exit(error)
+        if done not in checkpoints:
+            continue
+        stored = db._fetchone("SELECT COALESCE(SUM(LENGTH(CAST(body AS BLOB))), 0) FROM note_revisions "
+                              "WHERE note_id=?", (note.Id,), fresh=True)[0]
+        started = time.perf_counter()
+        db.get_note_revision_db(note.Id, 1)
+        rebuild_ms = (time.perf_counter() - started) * 1000
+        print(f"{done:>6}  {stored / 1024:>7.1f} KiB  {full_copies / 1024:>7.1f} KiB  {stored / full_copies:>6.3f}  "
+              f"{statistics.median(update_times) * 1000:>6.2f} ms  {rebuild_ms:>6.2f} ms")
+        update_times = []
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--edits", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--words", type=int, default=400, help="length of the paragraph note")
+    parser.add_argument("--shapes", default="lines,paragraph")
+    parser.add_argument("--checkpoints", default="10,100,1000")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    checkpoints = sorted({int(n) for n in args.checkpoints.split(",") if int(n) <= args.edits} | {args.edits})
+
+    workdir = tempfile.mkdtemp(prefix="studyqr-bench-")
+    os.environ["STUDYQR_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["STUDYQR_ATTACHMENT_DIR"] = os.path.join(workdir, "attachments")
+    os.environ["STUDYQR_METRICS"] = "0"
+    from src import db, revisions
+
+    db.init_db()
+    for shape in [s for s in args.shapes.split(",") if s]:
+        run(db, revisions, shape, args, checkpoints)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Time full-text note search (FTS5 + BM25) on a synthetic database.
+
+    python bench/search.py [--notes 1000000] [--users 5000]
+
+Seeds a throwaway database through the normal schema (so the FTS triggers do
+the indexing), then reports p50/p95/p99 latency for a mix of plain, prefix,
+multi-term and user-filtered searches. The target is p99 under 10 ms.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, SUBJECTS, percentile
+sys.path.insert(0, ROOT)
+
+def vocabulary(size, rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(size)]
+
+def seed(db, users, notes, words, rng):
+    batch = 20000
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users (User_Name, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+            ((f"user{i}", f"user{i}@example.com", "x", "2024-01-01") for i in range(users))
+        )
+    for start in range(0, notes, batch):
+        rows = []
+        for i in range(start, min(start + batch, notes)):
+            # Zipf-ish word choice so some terms are common and most are rare
+            text = " ".join(words[min(int(rng.paretovariate(1.2)) - 1, len(words) - 1)] for _ in range(40))
+            rows.append((text, "", rng.randint(1, users), rng.choice(SUBJECTS), f"2024-01-01 {i:09d}"))
+        with db.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO notes (content, qr_code_data, user_id, subject, created_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+        print(f"  seeded {min(start + batch, notes)}/{notes}", end="\r", file=sys.stderr)
+    print(file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="studyqr-bench-")
+    os.environ["STUDYQR_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["STUDYQR_ATTACHMENT_DIR"] = os.path.join(workdir, "attachments")
+    from src import db
+    from src.logic import NoteManager
+
+    db.init_db()
+    rng = random.Random(args.seed)
+    words = vocabulary(50000, rng)
+    start = time.perf_counter()
+    seed(db, args.users, args.notes, words, rng)
+    print(f"seeded {args.notes} notes in {time.perf_counter() - start:.1f}s")
+
+    manager = NoteManager()
+    mixes = {
+        "single term": lambda: (rng.choice(words[:2000]), {}),
+        "prefix": lambda: (rng.choice(words[:2000])[:3] + "*", {}),
+        "two terms": lambda: (f"{rng.choice(words[:200])} {rng.choice(words[:2000])}", {}),
+        "user filter": lambda: (rng.choice(words[:50]), {"user_id": rng.randint(1, args.users)}),
+        "subject filter": lambda: (rng.choice(words[:2000]), {"subject": rng.choice(SUBJECTS)}),
+    }
+    failed = False
+    for name, make in mixes.items():
+        samples = []
+        for _ in range(args.queries):
+            q, filters = make()
+            t0 = time.perf_counter()
+            manager.search_notes(q, limit=20, **filters)
+            samples.append((time.perf_counter() - t0) * 1000)
+        p99 = percentile(samples, 99)
+        failed |= p99 > 10
+        print(f"{name:15} p50 {statistics.median(samples):7.2f} ms  p95 {percentile(samples, 95):7.2f} ms  p99 {p99:7.2f} ms")
+    if failed:
+        print("p99 above 10 ms target")
+
+if __name__ == "__main__":
+    main()
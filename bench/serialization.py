@@ -0,0 +1,83 @@
+"""Compare row mapping + JSON encoding of a large note listing, old path vs new.
+
+    python bench/serialization.py [--notes 10000] [--runs 20]
+
+"dicts" rebuilds the previous path: plain sqlite tuples turned into one dict
+per note, then encoded the way FastAPI encodes a returned dict
+(jsonable_encoder, when FastAPI is installed, then json.dumps). "models" is
+the current path: rows built straight into slotted models by the row_factory
+and encoded with orjson. Reports median time per phase and peak traced memory.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+def legacy_rows(db, user_id):
+    columns = ", ".join(name for name in db.NOTE_FIELDS if name != "has_file")
+    with db.get_connection() as conn:
+        rows = conn.execute(f"SELECT {columns} FROM notes WHERE user_id=? ORDER BY created_at, Id", (user_id,)).fetchall()
+    return [{"Id": n[0], "content": n[1], "qr_code_data": n[2], "user_id": n[3], "subject": n[4],
+             "created_at": n[5], "file_name": n[6], "file_size": n[7], "has_file": n[7] is not None,
+             "file_status": n[8], "file_pages": n[9]} for n in rows]
+
+def legacy_encode(body):
+    try:
+        from fastapi.encoders import jsonable_encoder
+    except ImportError:
+        jsonable_encoder = lambda value: value
+    return json.dumps(jsonable_encoder(body), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def measure(fn, runs):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times) * 1000, peak / 2 ** 20, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="studyqr-bench-")
+    os.environ["STUDYQR_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["STUDYQR_ATTACHMENT_DIR"] = os.path.join(workdir, "attachments")
+    os.environ["STUDYQR_METRICS"] = "0"
+    import orjson
+    from src import db
+
+    db.init_db()
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO notes (content, qr_code_data, user_id, subject, created_at, file_name, file_size) "
+            "VALUES (?, ?, 1, ?, ?, ?, ?)",
+            ((f"note {i} " + "lorem ipsum dolor sit amet " * 8, "", "Physics", f"2024-01-01 {i:09d}",
+              "notes.pdf" if i % 10 == 0 else None, 1024 if i % 10 == 0 else None) for i in range(args.notes))
+        )
+
+    print(f"{args.notes} notes, median of {args.runs} runs")
+    for label, load, encode in (
+        ("dicts", lambda: legacy_rows(db, 1), lambda rows: legacy_encode({"success": True, "data": rows})),
+        ("models", lambda: db.get_notes_by_user_db(1), lambda rows: orjson.dumps({"success": True, "data": rows})),
+    ):
+        load_ms, load_mb, rows = measure(load, args.runs)
+        encode_ms, encode_mb, body = measure(lambda: encode(rows), args.runs)
+        print(f"{label:>7}  map {load_ms:7.2f} ms ({load_mb:5.1f} MiB peak)  "
+              f"encode {encode_ms:7.2f} ms ({encode_mb:5.1f} MiB peak)  body {len(body) / 2 ** 20:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Measure how read throughput scales with uvicorn worker processes.
+
+    python bench/workers.py [--workers 1,2,4,8] [--read-from primary,snapshot]
+                            [--scenarios qr_scan,list] [--client-processes 4]
+
+Seeds one database, then for each read source and worker count starts
+``uvicorn --workers N`` against it and drives each scenario (see bench/api.py)
+from --client-processes load generator processes, so the client is not the
+bottleneck. Every worker opens the same absolute STUDYQR_DB_PATH; writes are
+serialized across them by the database lock file.
+
+    primary   reads use mode=ro connections to the live WAL database
+    snapshot  reads use an immutable copy written by src/snapshots.py first
+
+Prints requests/sec, p50/p99 and the speedup over one worker, and writes the
+table to bench/results/workers-<commit>-<time>.json.
+
+Reading the results: with read-only connections nothing but the WAL index is
+shared, so qr_scan and list should scale close to linearly until the worker
+count reaches the number of cores (the client processes use cores too).
+Snapshot reads skip WAL lookups and locking entirely and are the ceiling for
+read scaling; their price is data up to STUDYQR_SNAPSHOT_INTERVAL seconds old.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, HttpConnection, bench_env, git_revision, seed, start_uvicorn, summarize
+from api import Workload
+
+async def _drive(port, args, scenario, stop_at, offset):
+    # stop_at is wall-clock time: monotonic clocks are not comparable across processes
+    latencies, errors = [], 0
+
+    async def client(i):
+        nonlocal errors
+        connection = HttpConnection(port)
+        workload = Workload(args, random.Random(offset + i))
+        try:
+            while time.time() < stop_at:
+                request = workload.next(scenario)
+                started = time.perf_counter()
+                status, _ = await connection.request(*request)
+                latencies.append(time.perf_counter() - started)
+                errors += status >= 400
+        finally:
+            await connection.close()
+
+    await asyncio.gather(*(client(i) for i in range(max(1, args.concurrency // args.client_processes))))
+    return latencies, errors
+
+def _client_process(port, args, scenario, warm_until, stop_at, offset):
+    asyncio.run(_drive(port, args, scenario, warm_until, offset))
+    return asyncio.run(_drive(port, args, scenario, stop_at, offset + 10000))
+
+def measure(port, args, scenario):
+    # Deadlines leave time for the client processes to start
+    warm_until = time.time() + 2 + args.warmup
+    stop_at = warm_until + args.duration
+    with multiprocessing.get_context("spawn").Pool(args.client_processes) as pool:
+        jobs = [pool.apply_async(_client_process, (port, args, scenario, warm_until, stop_at, i * 1000))
+                for i in range(args.client_processes)]
+        results = [job.get() for job in jobs]
+    latencies = [latency for result, _ in results for latency in result]
+    return summarize(latencies, args.duration, sum(errors for _, errors in results))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default=f"1,2,4,{os.cpu_count() or 4}")
+    parser.add_argument("--read-from", default="primary,snapshot")
+    parser.add_argument("--scenarios", default="qr_scan,list")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--notes", type=int, default=50000)
+    parser.add_argument("--attachment-kb", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=64, help="connections across all client processes")
+    parser.add_argument("--client-processes", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per measurement")
+    parser.add_argument("--warmup", type=float, default=2)
+    args = parser.parse_args()
+    worker_counts = sorted({int(n) for n in args.workers.split(",")})
+    scenarios = [s for s in args.scenarios.split(",") if s]
+
+    workdir = tempfile.mkdtemp(prefix="studyqr-workers-")
+    seed(workdir, args.users, args.notes, args.attachment_kb)
+    table = []
+    for read_from in [s for s in args.read_from.split(",") if s]:
+        if read_from == "snapshot":
+            subprocess.run([sys.executable, "-m", "src.snapshots", "--once"], cwd=ROOT, env=bench_env(workdir),
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for scenario in scenarios:
+            baseline = None
+            for workers in worker_counts:
+                proc, port = start_uvicorn(workdir, workers=workers, STUDYQR_DB_READ_FROM=read_from)
+                try:
+                    result = measure(port, args, scenario)
+                finally:
+                    proc.terminate()
+                    proc.wait()
+                baseline = baseline or result["rps"] or None
+                result.update(read_from=read_from, scenario=scenario, workers=workers,
+                              speedup=round(result["rps"] / baseline, 2) if baseline else None)
+                table.append(result)
+                print(f"{read_from:>8} {scenario:>8} {workers:>3} workers  {result['rps']:>8.0f} req/s  "
+                      f"x{result['speedup'] or 0:<5}  p50 {result['p50_ms'] or 0:6.2f} ms  "
+                      f"p99 {result['p99_ms'] or 0:6.2f} ms  errors {result['errors']}")
+
+    commit, dirty = git_revision()
+    os.makedirs(os.path.join(ROOT, "bench", "results"), exist_ok=True)
+    name = f"workers-{(commit or 'unknown')[:10]}-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:4]}.json"
+    path = os.path.join(ROOT, "bench", "results", name)
+    with open(path, "w") as f:
+        json.dump({"commit": commit, "dirty": dirty, "cpu_count": os.cpu_count(), "args": vars(args),
+                   "results": table}, f, indent=2)
+    print(f"\nwrote {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from src import db
+
+# --- Async access to the SQLite layer ---
+# sqlite3 blocks, so async callers hand db work to threads reserved for it.
+# Every write goes to one writer thread and runs in submission order: writers
+# never contend for SQLite's write lock or sit out busy_timeout behind each
+# other. Reads run on a pool of reader threads, concurrently with the writer
+# under WAL. Neither shares Starlette's threadpool, so slow blocking work
+# there (uploads, file streaming) cannot hold up database calls.
+READER_THREADS = db.POOL_SIZE  # one per read-only connection; writes have their own pool
+
+_readers = None
+_writer = None
+_lock = threading.Lock()
+
+def _executors():
+    global _readers, _writer
+    with _lock:
+        if _writer is None:
+            _readers = ThreadPoolExecutor(READER_THREADS, thread_name_prefix="studyqr-db-read")
+            _writer = ThreadPoolExecutor(1, thread_name_prefix="studyqr-db-write")
+        return _readers, _writer
+
+async def read(fn, *args, **kwargs):
+    """Run the blocking read ``fn(*args, **kwargs)`` on a reader thread."""
+    return await asyncio.get_running_loop().run_in_executor(_executors()[0], partial(fn, *args, **kwargs))
+
+async def write(fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` on the writer thread, after every write queued before it."""
+    return await asyncio.get_running_loop().run_in_executor(_executors()[1], partial(fn, *args, **kwargs))
+
+def shutdown():
+    global _readers, _writer
+    with _lock:
+        if _writer is not None:
+            # Writes already queued still run; their requests are waiting on them
+            _writer.shutdown(wait=True)
+            _readers.shutdown(wait=False, cancel_futures=True)
+            _readers = _writer = None
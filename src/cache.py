@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- Read-through caches for note reads ---
+# Writes in NoteManager invalidate the affected entries immediately. The TTL
+# only bounds staleness across worker processes, since each keeps its own copy.
+CACHE_TTL = float(os.getenv("STUDYQR_CACHE_TTL", "30"))
+CACHE_SIZE = int(os.getenv("STUDYQR_CACHE_SIZE", "2048"))
+
+class TTLCache:
+    """Size-bounded LRU whose entries also expire ``ttl`` seconds after being stored.
+
+    Entries may carry a tag (e.g. a user id) so that every page cached for that
+    user can be dropped at once. Cached values are shared between callers and
+    must be treated as read-only.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, tag, value)
+        self._tags = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader, tag=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            generation = self._generation
+        value = loader()
+        with self._lock:
+            # An invalidation while loading means the value may already be stale
+            if generation == self._generation and value is not None:
+                self._store(key, value, tag, now + self.ttl)
+        return value
+
+    def _store(self, key, value, tag, expires_at):
+        self._discard(key)
+        self._entries[key] = (expires_at, tag, value)
+        if tag is not None:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[1] is not None:
+            keys = self._tags.get(entry[1])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[entry[1]]
+
+    def invalidate(self, key=None, tag=None):
+        with self._lock:
+            self._generation += 1
+            if key is not None:
+                self._discard(key)
+            if tag is not None:
+                for tagged in list(self._tags.get(tag, ())):
+                    self._discard(tagged)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+notes = TTLCache()        # note_id -> note dict
+user_notes = TTLCache()   # (user_id, *list params) -> page, tagged with user_id
+view_pages = TTLCache()   # note_id -> rendered /notes/view page
+
+def invalidate_note(note_id, user_id):
+    notes.invalidate(key=note_id)
+    view_pages.invalidate(key=note_id)
+    user_notes.invalidate(tag=user_id)
+
+def stats():
+    return {"notes": notes.stats(), "user_notes": user_notes.stats(), "view_pages": view_pages.stats()}
@@ -1,99 +1,921 @@
+import html
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
 
-# --- Persistent database ---
-conn = sqlite3.connect("studyqr.db", check_same_thread=False)
-cursor = conn.cursor()
-
-# --- Users table ---
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS users (
-    Id INTEGER PRIMARY KEY AUTOINCREMENT,
-    User_Name TEXT NOT NULL,
-    email TEXT NOT NULL UNIQUE,
-    password_hash TEXT NOT NULL,
-    created_at TEXT NOT NULL
-)
-""")
-
-# --- Notes table ---
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS notes (
-    Id INTEGER PRIMARY KEY AUTOINCREMENT,
-    content TEXT NOT NULL,
-    qr_code_data TEXT,
-    user_id INTEGER NOT NULL,
-    subject TEXT NOT NULL,
-    created_at TEXT NOT NULL,
-    file_name TEXT,
-    file_data BLOB,
-    FOREIGN KEY(user_id) REFERENCES users(Id)
-)
-""")
-conn.commit()
+try:
+    import fcntl
+except ImportError:  # Windows: writers are serialized within the process only
+    fcntl = None
+
+from src import metrics, models, revisions, storage
+
+# --- Configuration ---
+# Every process (each uvicorn worker, the ingest and snapshot runners) must
+# open the same file, so the path is made absolute once, independent of the
+# working directory. The default is the database next to the API, in
+# storage.DATA_DIR alongside the attachment store and QR cache.
+DB_PATH = os.path.abspath(os.getenv("STUDYQR_DB_PATH", os.path.join(storage.DATA_DIR, "studyqr.db")))
+POOL_SIZE = int(os.getenv("STUDYQR_DB_POOL_SIZE", "8"))
+WRITE_POOL_SIZE = 2
+POOL_TIMEOUT = float(os.getenv("STUDYQR_DB_POOL_TIMEOUT", "30"))
+# Where reads are served from: "primary" (the live database, opened read-only)
+# or "snapshot" (the latest copy written by `python -m src.snapshots`; reads
+# may be up to one snapshot interval old). Writes always go to the primary.
+READ_FROM = os.getenv("STUDYQR_DB_READ_FROM", "primary")
+SNAPSHOT_PATH = os.path.abspath(os.getenv("STUDYQR_DB_SNAPSHOT_PATH", DB_PATH + ".snapshot"))
+# Serialize write transactions across processes with a lock file, so workers
+# queue in the kernel instead of polling SQLite's busy handler.
+WRITE_LOCK = os.getenv("STUDYQR_DB_WRITE_LOCK", "1") != "0"
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,         # ~16 MB page cache per connection
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+# Read-only connections cannot change the journal mode and never sync
+READ_PRAGMAS = {name: value for name, value in PRAGMAS.items() if name not in ("journal_mode", "synchronous")}
+READ_PRAGMAS["query_only"] = 1
+
+# --- Query instrumentation ---
+# With metrics or the slow-query log on, connections time every execute() and
+# count the rows and bytes fetched through their cursors. Otherwise plain
+# sqlite3 connections are used and nothing is measured.
+class _TimedCursor(sqlite3.Cursor):
+    _sql = ""
+
+    def execute(self, sql, params=()):
+        self._sql = sql
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            metrics.record_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_params):
+        self._sql = sql
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            metrics.record_query(sql, time.perf_counter() - started)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            metrics.record_rows(self._sql, (row,))
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        metrics.record_rows(self._sql, rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        metrics.record_rows(self._sql, rows)
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        metrics.record_rows(self._sql, (row,))
+        return row
+
+class _TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor(_TimedCursor).execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor(_TimedCursor).executemany(sql, seq_of_params)
+
+INSTRUMENTED = metrics.ENABLED or bool(metrics.SLOW_QUERY_MS)
+
+# --- Connection pool ---
+class ConnectionPool:
+    """Bounded pool of SQLite connections handed out one caller at a time.
+
+    Connections are opened lazily up to ``size``; once all are checked out,
+    callers block for up to ``timeout`` seconds waiting for one to be returned.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        factory = _TimedConnection if INSTRUMENTED else sqlite3.Connection
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, factory=factory)
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def _reuse(self, conn):
+        return conn
+
+    def acquire(self):
+        try:
+            conn = self._reuse(self._idle.get_nowait())
+        except queue.Empty:
+            pass
+        else:
+            if metrics.ENABLED:
+                metrics.db_pool_wait.observe(0.0)
+            return conn
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        started = time.perf_counter()
+        try:
+            conn = self._reuse(self._idle.get(timeout=self.timeout))
+        except queue.Empty:
+            raise TimeoutError(f"No database connection available after {self.timeout}s")
+        if metrics.ENABLED:
+            metrics.db_pool_wait.observe(time.perf_counter() - started)
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+class ReadOnlyPool(ConnectionPool):
+    """Pool of ``mode=ro`` connections to the primary, or to the snapshot file.
+
+    Snapshots are opened ``immutable`` (no locking or change detection at
+    all) and replaced by rename, so a connection is reopened once the file at
+    ``snapshot_path`` is a newer snapshot than the one it has open. Until the
+    first snapshot exists, reads go to the primary.
+    """
+
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT, snapshot_path=None):
+        super().__init__(path, size, timeout)
+        self.snapshot_path = snapshot_path
+        self._generation = None
+        self._checked_at = 0.0
+        self._opened_generation = {}
+
+    def _current_generation(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.CHECK_INTERVAL:
+            try:
+                st = os.stat(self.snapshot_path)
+                self._generation = (st.st_ino, st.st_mtime_ns)
+            except FileNotFoundError:
+                self._generation = None
+            self._checked_at = now
+        return self._generation
+
+    def _connect(self):
+        factory = _TimedConnection if INSTRUMENTED else sqlite3.Connection
+        generation = self._current_generation() if self.snapshot_path else None
+        if generation is not None:
+            uri = f"file:{quote(self.snapshot_path)}?mode=ro&immutable=1"
+        else:
+            uri = f"file:{quote(self.path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None, factory=factory)
+        for name, value in READ_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        self._opened_generation[id(conn)] = generation
+        return conn
+
+    def _reuse(self, conn):
+        if self.snapshot_path is None or self._opened_generation.get(id(conn)) == self._current_generation():
+            return conn
+        self._opened_generation.pop(id(conn), None)
+        conn.close()
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+def _make_pools(size):
+    # Writes, read-only reads of the primary, and the reads that may come
+    # from a snapshot (the same pool unless READ_FROM is "snapshot")
+    write_pool = ConnectionPool(DB_PATH, WRITE_POOL_SIZE)
+    read_pool = ReadOnlyPool(DB_PATH, size)
+    if READ_FROM == "snapshot":
+        return write_pool, read_pool, ReadOnlyPool(DB_PATH, size, snapshot_path=SNAPSHOT_PATH)
+    return write_pool, read_pool, read_pool
+
+_pool, _read_pool, _snapshot_pool = _make_pools(POOL_SIZE)
+
+@contextmanager
+def get_connection(readonly=False, fresh=True):
+    """A pooled connection: read-write, or with ``readonly`` a ``mode=ro`` one.
+
+    Read-only connections that need not see the latest commit (``fresh=False``)
+    read from the snapshot when READ_FROM is "snapshot".
+    """
+    pool = (_read_pool if fresh else _snapshot_pool) if readonly else _pool
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+class _WriteLock:
+    """Process-wide lock plus an flock() on ``<database>.lock`` shared by all processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if WRITE_LOCK and fcntl is not None:
+            try:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+_write_lock = _WriteLock(DB_PATH + ".lock")
+
+@contextmanager
+def transaction():
+    # One write transaction at a time across every process using DB_PATH.
+    # BEGIN IMMEDIATE still takes SQLite's write lock up front, for writers
+    # that bypass this module (e.g. the sqlite3 shell).
+    with get_connection() as conn, _write_lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+def _execute(conn, sql, params=(), model=None):
+    # Rows come back as ``model`` instances (src/models.py) when one is given
+    cursor = conn.cursor()
+    if model is not None:
+        cursor.row_factory = models.row_factory(model)
+    return cursor.execute(sql, params)
+
+def _fetchone(sql, params=(), model=None, fresh=False):
+    with get_connection(readonly=True, fresh=fresh) as conn:
+        return _execute(conn, sql, params, model).fetchone()
+
+def _fetchall(sql, params=(), model=None, fresh=False):
+    with get_connection(readonly=True, fresh=fresh) as conn:
+        return _execute(conn, sql, params, model).fetchall()
+
+# --- Schema migrations ---
+# Each migration runs once, in order, inside the same transaction as the
+# PRAGMA user_version bump that records it. Append new steps; never edit
+# ones that have shipped.
+def _migration_base_schema(conn):
+    # Databases created before versioning already have these tables.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        Id INTEGER PRIMARY KEY AUTOINCREMENT,
+        User_Name TEXT NOT NULL,
+        email TEXT NOT NULL UNIQUE,
+        password_hash TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS notes (
+        Id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content TEXT NOT NULL,
+        qr_code_data TEXT,
+        user_id INTEGER NOT NULL,
+        subject TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        file_name TEXT,
+        file_data BLOB,
+        FOREIGN KEY(user_id) REFERENCES users(Id)
+    )
+    """)
+
+def _migration_attachment_store(conn):
+    # Attachment bytes used to live in SQLite, first inline in notes.file_data
+    # and later in a note_files side table. Move them into the on-disk store.
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(notes)")}
+    for name, decl in (("file_size", "INTEGER"), ("file_hash", "TEXT")):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE notes ADD COLUMN {name} {decl}")
+    sources = []
+    if "file_data" in columns:
+        sources.append(("notes", "Id", "SELECT Id FROM notes WHERE file_data IS NOT NULL"))
+    has_note_files = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='note_files'"
+    ).fetchone()
+    if has_note_files:
+        sources.append(("note_files", "note_id", "SELECT note_id FROM note_files"))
+    for table, key, query in sources:
+        # One blob in memory at a time
+        for (note_id,) in conn.execute(query).fetchall():
+            (file_data,) = conn.execute(f"SELECT file_data FROM {table} WHERE {key}=?", (note_id,)).fetchone()
+            file_hash, file_size = storage.save(file_data)
+            conn.execute("UPDATE notes SET file_hash=?, file_size=? WHERE Id=?", (file_hash, file_size, note_id))
+    if "file_data" in columns:
+        conn.execute("ALTER TABLE notes DROP COLUMN file_data")
+    if has_note_files:
+        conn.execute("DROP TABLE note_files")
+
+def _migration_indexes(conn):
+    # Listing a user's notes newest-first, and the shared-attachment check on delete
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notes_user_created ON notes(user_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notes_file_hash ON notes(file_hash) WHERE file_hash IS NOT NULL")
+
+def _migration_search_index(conn):
+    # External-content FTS5 index over notes, kept in sync by triggers.
+    # user_id is indexed as a token so per-user searches intersect doclists
+    # inside FTS5 instead of filtering every match afterwards; prefix='2 3'
+    # keeps "term*" queries cheap.
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        content, subject, user_id,
+        content='notes', content_rowid='Id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, content, subject, user_id) VALUES (new.Id, new.content, new.subject, new.user_id);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, content, subject, user_id)
+        VALUES ('delete', old.Id, old.content, old.subject, old.user_id);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF content, subject, user_id ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, content, subject, user_id)
+        VALUES ('delete', old.Id, old.content, old.subject, old.user_id);
+        INSERT INTO notes_fts(rowid, content, subject, user_id) VALUES (new.Id, new.content, new.subject, new.user_id);
+    END
+    """)
+    # Persisted ranking for ORDER BY rank: subject hits count double, user_id not at all
+    conn.execute("INSERT INTO notes_fts(notes_fts, rank) VALUES ('rank', 'bm25(1.0, 2.0, 0.0)')")
+    conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+def _migration_attachment_extraction(conn):
+    # Text, page count and thumbnail extracted from PDF attachments by the
+    # background pipeline in src/ingest.py, plus its durable job queue.
+    for name, decl in (("file_status", "TEXT"), ("file_pages", "INTEGER"),
+                       ("file_thumbnail", "TEXT"), ("file_text", "TEXT")):
+        conn.execute(f"ALTER TABLE notes ADD COLUMN {name} {decl}")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS extraction_jobs (
+        Id INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_hash TEXT NOT NULL UNIQUE,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at REAL NOT NULL,
+        locked_until REAL,
+        last_error TEXT,
+        created_at REAL NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_jobs_status ON extraction_jobs(status, available_at)")
+
+    # Rebuild the search index with the extracted text as a fourth column
+    for trigger in ("notes_fts_insert", "notes_fts_delete", "notes_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS notes_fts")
+    conn.execute("""
+    CREATE VIRTUAL TABLE notes_fts USING fts5(
+        content, subject, user_id, file_text,
+        content='notes', content_rowid='Id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """)
+    conn.execute("""
+    CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, content, subject, user_id, file_text)
+        VALUES (new.Id, new.content, new.subject, new.user_id, new.file_text);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, content, subject, user_id, file_text)
+        VALUES ('delete', old.Id, old.content, old.subject, old.user_id, old.file_text);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER notes_fts_update AFTER UPDATE OF content, subject, user_id, file_text ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, content, subject, user_id, file_text)
+        VALUES ('delete', old.Id, old.content, old.subject, old.user_id, old.file_text);
+        INSERT INTO notes_fts(rowid, content, subject, user_id, file_text)
+        VALUES (new.Id, new.content, new.subject, new.user_id, new.file_text);
+    END
+    """)
+    conn.execute("INSERT INTO notes_fts(notes_fts, rank) VALUES ('rank', 'bm25(1.0, 2.0, 0.0, 0.5)')")
+    conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+    # Queue extraction for attachments uploaded before the pipeline existed
+    for (file_hash,) in conn.execute("SELECT DISTINCT file_hash FROM notes WHERE file_hash IS NOT NULL").fetchall():
+        note_ids = [row[0] for row in conn.execute("SELECT Id FROM notes WHERE file_hash=?", (file_hash,))]
+        _queue_extraction(conn, file_hash, note_ids)
+
+def _migration_note_revisions(conn):
+    # Edit history (src/revisions.py) and the version counter that optimistic
+    # concurrency checks against
+    conn.execute("ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS note_revisions (
+        note_id INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        body TEXT NOT NULL,
+        replaced_at TEXT NOT NULL,
+        PRIMARY KEY (note_id, version)
+    ) WITHOUT ROWID
+    """)
+
+MIGRATIONS = [
+    _migration_base_schema,
+    _migration_attachment_store,
+    _migration_indexes,
+    _migration_search_index,
+    _migration_attachment_extraction,
+    _migration_note_revisions,
+]
+
+def init_db():
+    """Create or migrate the schema. Each entry point (the API's lifespan, the
+    CLI runners, scripts) calls this once at startup; importing the module
+    does not touch the database."""
+    with transaction() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
 
 # --- User operations ---
 def add_user_db(user_name, email, password_hash, created_at):
     try:
-        cursor.execute(
-            "INSERT INTO users (User_Name, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
-            (user_name, email, password_hash, created_at)
-        )
-        conn.commit()
-        cursor.execute("SELECT * FROM users WHERE email=?", (email,))
-        return cursor.fetchone(), None
+        with transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO users (User_Name, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                (user_name, email, password_hash, created_at)
+            )
+            user = _execute(conn, f"SELECT {models.columns(models.User)} FROM users WHERE Id=?", (cur.lastrowid,), models.User)
+            return user.fetchone(), None
     except Exception as e:
         return None, str(e)
 
+def update_user_password_db(user_id, password_hash):
+    try:
+        with transaction() as conn:
+            conn.execute("UPDATE users SET password_hash=? WHERE Id=?", (password_hash, user_id))
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
 def get_user_by_email_db(email):
-    cursor.execute("SELECT * FROM users WHERE email=?", (email,))
-    return cursor.fetchone()
+    # From the primary: a user can log in right after registering
+    return _fetchone("SELECT * FROM users WHERE email=?", (email,), fresh=True)
+
+# Public user columns; password_hash is only read by get_user_by_email_db.
+USER_FIELDS = models.field_names(models.User)
 
-def get_all_users_db():
-    cursor.execute("SELECT * FROM users")
-    return cursor.fetchall()
+def _page_query(table, model, where, params, order_by, after_id, limit, descending):
+    # Keyset pagination: rows strictly after the cursor row in (order_by..., Id) order.
+    direction, op = ("DESC", "<") if descending else ("ASC", ">")
+    keys = [*order_by, "Id"]
+    sql = f"SELECT {models.columns(model)} FROM {table}"
+    clauses, params = ([where] if where else []), list(params)
+    if after_id is not None:
+        key_list = ", ".join(keys)
+        clauses.append(f"({key_list}) {op} (SELECT {key_list} FROM {table} WHERE Id=?)")
+        params.append(after_id)
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY " + ", ".join(f"{key} {direction}" for key in keys)
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+def get_all_users_db(after_id=None, limit=None, descending=False, model=models.User):
+    sql, params = _page_query("users", model, None, (), (), after_id, limit, descending)
+    return _fetchall(sql, params, model)
+
+def get_user_note_summaries_db(user_ids, notes_per_user):
+    # Note counts plus each user's latest notes for a whole page of users in
+    # two queries, instead of one request per user from the admin page.
+    if not user_ids:
+        return {}, []
+    marks = ", ".join("?" * len(user_ids))
+    counts = dict(_fetchall(
+        f"SELECT user_id, count(*) FROM notes WHERE user_id IN ({marks}) GROUP BY user_id", user_ids
+    ))
+    latest = _fetchall(f"""
+        SELECT {models.columns(models.NoteSummary)} FROM (
+            SELECT Id, user_id, subject, created_at,
+                   row_number() OVER (PARTITION BY user_id ORDER BY created_at DESC, Id DESC) AS position
+            FROM notes WHERE user_id IN ({marks})
+        ) WHERE position <= ?
+        ORDER BY user_id, position
+    """, [*user_ids, notes_per_user], models.NoteSummary)
+    return counts, latest
 
 # --- Note operations ---
-def add_note_db(content, qr_code_data, user_id, subject, created_at, file_name=None, file_data=None):
-    try:
-        cursor.execute(
-            "INSERT INTO notes (content, qr_code_data, user_id, subject, created_at, file_name, file_data) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (content, qr_code_data, user_id, subject, created_at, file_name, file_data)
+# Every metadata query projects these columns explicitly; attachment bytes live
+# in the content-addressed store (src/storage.py), never in SQLite.
+NOTE_FIELDS = models.field_names(models.Note)
+NOTE_COLUMNS = models.columns(models.Note)
+
+def _queue_extraction(conn, file_hash, note_ids):
+    # Extraction is idempotent per content hash: reuse results from another
+    # note with the same file, or join the job that is already queued for it.
+    marks = ", ".join("?" * len(note_ids))
+    if not storage.is_pdf(file_hash):
+        conn.execute(f"UPDATE notes SET file_status='skipped' WHERE Id IN ({marks})", note_ids)
+        return
+    done = conn.execute(
+        "SELECT file_pages, file_thumbnail, file_text FROM notes WHERE file_hash=? AND file_status='ready' LIMIT 1",
+        (file_hash,)
+    ).fetchone()
+    if done:
+        conn.execute(
+            f"UPDATE notes SET file_status='ready', file_pages=?, file_thumbnail=?, file_text=? WHERE Id IN ({marks})",
+            [*done, *note_ids]
         )
-        conn.commit()
-        cursor.execute("SELECT * FROM notes WHERE Id = last_insert_rowid()")
-        return cursor.fetchone(), None
+        return
+    conn.execute(f"UPDATE notes SET file_status='pending' WHERE Id IN ({marks})", note_ids)
+    now = time.time()
+    conn.execute("""
+        INSERT INTO extraction_jobs (file_hash, status, attempts, available_at, created_at)
+        VALUES (?, 'queued', 0, ?, ?)
+        ON CONFLICT(file_hash) DO UPDATE SET status='queued', attempts=0, available_at=excluded.available_at,
+                                             last_error=NULL
+        WHERE status IN ('done', 'failed')
+    """, (file_hash, now, now))
+
+def add_note_db(content, qr_code_data, user_id, subject, created_at, file_name=None, file_hash=None, file_size=None):
+    try:
+        with transaction() as conn:
+            # Checked under the write lock: a concurrent delete of the last note
+            # sharing this hash may have removed the file after it was stored.
+            if file_hash is not None and not storage.exists(file_hash):
+                raise FileNotFoundError("Attachment was removed concurrently, please retry the upload")
+            cur = conn.execute(
+                "INSERT INTO notes (content, qr_code_data, user_id, subject, created_at, file_name, file_size, file_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (content, qr_code_data, user_id, subject, created_at, file_name, file_size, file_hash)
+            )
+            if file_hash is not None:
+                _queue_extraction(conn, file_hash, [cur.lastrowid])
+            return _execute(conn, f"SELECT {NOTE_COLUMNS} FROM notes WHERE Id=?", (cur.lastrowid,), models.Note).fetchone(), None
     except Exception as e:
         return None, str(e)
 
-def get_notes_by_user_db(user_id):
-    cursor.execute("SELECT * FROM notes WHERE user_id=?", (user_id,))
-    return cursor.fetchall()
+# SQLite caps bound parameters per statement (32766); 8 per note leaves headroom.
+BULK_INSERT_CHUNK = 500
 
-def get_note_by_id_db(note_id):
-    cursor.execute("SELECT * FROM notes WHERE Id=?", (note_id,))
-    return cursor.fetchone()
+def add_notes_bulk_db(rows):
+    """Insert many notes in one transaction and return the stored rows in input order.
 
-def update_note_db(note_id, new_content):
+    ``rows`` are (content, qr_code_data, user_id, subject, created_at, file_name,
+    file_size, file_hash) tuples. executemany() cannot hand back RETURNING rows,
+    so each chunk is a single multi-row INSERT ... RETURNING instead.
+    """
     try:
-        cursor.execute("UPDATE notes SET content=? WHERE Id=?", (new_content, note_id))
-        conn.commit()
-        return get_note_by_id_db(note_id), None
+        created = []
+        with transaction() as conn:
+            for file_hash in {row[7] for row in rows if row[7] is not None}:
+                if not storage.exists(file_hash):
+                    raise FileNotFoundError("Attachment was removed concurrently, please retry the import")
+            for start in range(0, len(rows), BULK_INSERT_CHUNK):
+                chunk = rows[start:start + BULK_INSERT_CHUNK]
+                placeholders = ", ".join(["(?, ?, ?, ?, ?, ?, ?, ?)"] * len(chunk))
+                returned = _execute(
+                    conn,
+                    "INSERT INTO notes (content, qr_code_data, user_id, subject, created_at, file_name, file_size, file_hash) "
+                    f"VALUES {placeholders} RETURNING {NOTE_COLUMNS}",
+                    [value for row in chunk for value in row],
+                    models.Note
+                ).fetchall()
+                # RETURNING order is unspecified; ids are allocated in VALUES order
+                created.extend(sorted(returned, key=lambda note: note.Id))
+            by_hash = {}
+            for note, row in zip(created, rows):
+                if row[7] is not None:
+                    by_hash.setdefault(row[7], []).append(note.Id)
+            for file_hash, note_ids in by_hash.items():
+                _queue_extraction(conn, file_hash, note_ids)
+            # Re-read notes with attachments so they carry their extraction status
+            with_files = {note_id for note_ids in by_hash.values() for note_id in note_ids}
+            created = [_execute(conn, f"SELECT {NOTE_COLUMNS} FROM notes WHERE Id=?", (note.Id,), models.Note).fetchone()
+                       if note.Id in with_files else note for note in created]
+        return created, None
+    except Exception as e:
+        return None, str(e)
+
+def get_notes_by_user_db(user_id, after_id=None, limit=None, descending=False, model=models.Note):
+    # Ordered by (created_at, Id) so pages walk idx_notes_user_created
+    sql, params = _page_query("notes", model, "user_id=?", (user_id,), ("created_at",),
+                              after_id, limit, descending)
+    return _fetchall(sql, params, model)
+
+def iter_notes_for_export_db(user_id, page_size=500):
+    # Walks every note of a user one keyset page at a time, including the
+    # attachment hash needed to locate files in the store.
+    after_id = None
+    while True:
+        sql, params = _page_query("notes", models.ExportNote, "user_id=?", (user_id,), ("created_at",),
+                                  after_id, page_size, False)
+        rows = _fetchall(sql, params, models.ExportNote)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after_id = rows[-1].Id
+
+def iter_all_notes_db(page_size=500):
+    # Every note in Id order, one keyset page at a time (static page rebuilds)
+    after_id = None
+    while True:
+        sql, params = _page_query("notes", models.Note, None, (), (), after_id, page_size, False)
+        rows = _fetchall(sql, params, models.Note, fresh=True)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after_id = rows[-1].Id
+
+def count_matches_db(match, cap):
+    # Counts matching notes but stops at cap, so it is cheap even for terms
+    # that occur in almost every note.
+    return _fetchone(
+        "SELECT count(*) FROM (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? LIMIT ?)", (match, cap)
+    )[0]
+
+# FTS5 wraps matches in these control characters; _highlight escapes the
+# note text as HTML and only then turns them into <mark> tags, so markup in
+# a note can never reach a client that renders the highlights.
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+
+def _highlight(text):
+    if text is None:
+        return None
+    return html.escape(text).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+def search_notes_db(match, ranked=True, subject=None, limit=20, offset=0):
+    # match must already be a valid FTS5 query (see logic._fts_query). Both
+    # orderings are consumed by FTS5 itself, so snippets are only built for
+    # the rows on the requested page.
+    sql = f"""
+        SELECT n.Id, n.user_id, n.subject, n.created_at, n.file_name, n.file_size IS NOT NULL AS has_file,
+               snippet(notes_fts, 0, char(2), char(3), '…', 16) AS snippet,
+               highlight(notes_fts, 1, char(2), char(3)) AS subject_highlight,
+               nullif(snippet(notes_fts, 3, char(2), char(3), '…', 16), '') AS file_snippet,
+               {"-notes_fts.rank" if ranked else "NULL"} AS score
+        FROM notes_fts JOIN notes n ON n.Id = notes_fts.rowid
+        WHERE notes_fts MATCH ?
+    """
+    params = [match]
+    if subject is not None:
+        sql += " AND n.subject = ? COLLATE NOCASE"
+        params.append(subject)
+    sql += f" ORDER BY {'notes_fts.rank' if ranked else 'notes_fts.rowid DESC'} LIMIT ? OFFSET ?"
+    params += [limit, offset]
+    hits = _fetchall(sql, params, models.SearchHit)
+    for hit in hits:
+        hit.snippet = _highlight(hit.snippet)
+        hit.subject_highlight = _highlight(hit.subject_highlight)
+        hit.file_snippet = _highlight(hit.file_snippet)
+    return hits
+
+def discard_unused_files_db(file_hashes):
+    # Removes stored attachments that no note refers to, e.g. files saved for
+    # a bulk import whose insert failed. Checked under the write lock, like
+    # delete_note_db, so a note being inserted concurrently keeps its file.
+    file_hashes = list(file_hashes)
+    try:
+        with transaction() as conn:
+            for start in range(0, len(file_hashes), 500):
+                chunk = file_hashes[start:start + 500]
+                marks = ", ".join("?" * len(chunk))
+                used = {row[0] for row in conn.execute(
+                    f"SELECT file_hash FROM notes WHERE file_hash IN ({marks}) "
+                    f"UNION SELECT file_thumbnail FROM notes WHERE file_thumbnail IN ({marks})", chunk + chunk
+                )}
+                for file_hash in chunk:
+                    if file_hash not in used:
+                        storage.delete(file_hash)
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+def get_note_thumbnail_db(note_id):
+    row = _fetchone("SELECT file_thumbnail FROM notes WHERE Id=?", (note_id,))
+    return row[0] if row else None
+
+# --- Attachment extraction queue ---
+def claim_extraction_jobs_db(limit, lease_seconds):
+    # Queued jobs that are due, plus running ones whose lease expired because
+    # their worker died. The lease keeps two dispatchers from taking the same job.
+    now = time.time()
+    with transaction() as conn:
+        return conn.execute("""
+            UPDATE extraction_jobs SET status='running', attempts=attempts+1, locked_until=?
+            WHERE Id IN (
+                SELECT Id FROM extraction_jobs
+                WHERE (status='queued' AND available_at<=?) OR (status='running' AND locked_until<=?)
+                ORDER BY available_at LIMIT ?
+            )
+            RETURNING Id, file_hash, attempts
+        """, (now + lease_seconds, now, now, limit)).fetchall()
+
+def complete_extraction_job_db(job_id, file_hash, text, pages, thumbnail_hash):
+    # Returns (Id, user_id) of every note that shares the file
+    with transaction() as conn:
+        notes = conn.execute("""
+            UPDATE notes SET file_status='ready', file_text=?, file_pages=?, file_thumbnail=?
+            WHERE file_hash=? RETURNING Id, user_id
+        """, (text, pages, thumbnail_hash, file_hash)).fetchall()
+        conn.execute("UPDATE extraction_jobs SET status='done', locked_until=NULL, last_error=NULL WHERE Id=?", (job_id,))
+        return notes
+
+def fail_extraction_job_db(job_id, file_hash, error, retry_at=None):
+    with transaction() as conn:
+        if retry_at is not None:
+            conn.execute(
+                "UPDATE extraction_jobs SET status='queued', available_at=?, locked_until=NULL, last_error=? WHERE Id=?",
+                (retry_at, error, job_id)
+            )
+            return []
+        conn.execute(
+            "UPDATE extraction_jobs SET status='failed', locked_until=NULL, last_error=? WHERE Id=?", (error, job_id)
+        )
+        return conn.execute(
+            "UPDATE notes SET file_status='failed' WHERE file_hash=? RETURNING Id, user_id", (file_hash,)
+        ).fetchall()
+
+def extraction_queue_stats_db():
+    return dict(_fetchall("SELECT status, count(*) FROM extraction_jobs GROUP BY status"))
+
+def note_exists_db(note_id):
+    return _fetchone("SELECT 1 FROM notes WHERE Id=?", (note_id,), fresh=True) is not None
+
+def get_note_by_id_db(note_id, fresh=False):
+    return _fetchone(f"SELECT {NOTE_COLUMNS} FROM notes WHERE Id=?", (note_id,), models.Note, fresh)
+
+def get_note_file_db(note_id, fresh=False):
+    return _fetchone(
+        "SELECT file_name, file_hash, file_size FROM notes WHERE Id=? AND file_hash IS NOT NULL",
+        (note_id,), fresh=fresh
+    )
+
+def _owned(user_id):
+    # Ownership is part of the statement itself, so a write by anyone but the
+    # owner matches no row instead of needing a separate lookup first.
+    return ("Id=? AND user_id=?", (user_id,)) if user_id is not None else ("Id=?", ())
+
+def update_note_db(note_id, new_content, user_id=None, expected_version=None):
+    # Returns (None, None) when no note with that id belongs to user_id, or
+    # when it is no longer at expected_version. The replaced text is kept as
+    # a revision in the same transaction.
+    where, params = _owned(user_id)
+    if expected_version is not None:
+        where, params = f"{where} AND version=?", (*params, expected_version)
+    try:
+        with transaction() as conn:
+            previous = conn.execute("SELECT content, version FROM notes WHERE Id=?", (note_id,)).fetchone()
+            note = _execute(
+                conn, f"UPDATE notes SET content=?, version=version+1 WHERE {where} RETURNING {NOTE_COLUMNS}",
+                (new_content, note_id, *params), models.Note
+            ).fetchone()
+            if note is not None:
+                kind, body = revisions.encode(previous[1], new_content, previous[0])
+                conn.execute(
+                    "INSERT INTO note_revisions (note_id, version, kind, body, replaced_at) "
+                    "VALUES (?, ?, ?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'))",
+                    (note_id, previous[1], kind, body)
+                )
+            return note, None
     except Exception as e:
         return None, str(e)
 
+def list_note_revisions_db(note_id, before=None, limit=50):
+    # Newest first; pass the last version seen as ``before`` for the next page
+    sql = "SELECT version, kind, length(body), replaced_at FROM note_revisions WHERE note_id=?"
+    params = [note_id]
+    if before is not None:
+        sql += " AND version<?"
+        params.append(before)
+    sql += " ORDER BY version DESC LIMIT ?"
+    params.append(limit)
+    return _fetchall(sql, params, models.Revision, fresh=True)
+
+def get_note_revision_db(note_id, version):
+    """The note's text as of ``version``, or None if there is no such version."""
+    with get_connection(readonly=True, fresh=True) as conn:
+        # One read transaction: the current text and the revisions agree
+        conn.execute("BEGIN")
+        try:
+            current = conn.execute("SELECT content, version FROM notes WHERE Id=?", (note_id,)).fetchone()
+            if current is None or not 1 <= version <= current[1]:
+                return None
+            if version == current[1]:
+                return current[0]
+            # Walk down from the nearest full copy at or above ``version`` (or the current text)
+            chain = conn.execute(
+                "SELECT kind, body FROM note_revisions WHERE note_id=? AND version>=? AND version<=coalesce("
+                "(SELECT min(version) FROM note_revisions WHERE note_id=? AND version>=? AND kind='snapshot'), ?) "
+                "ORDER BY version DESC",
+                (note_id, version, note_id, version, current[1])
+            ).fetchall()
+            return revisions.rebuild(current[0], chain)
+        finally:
+            conn.execute("COMMIT")
+
 def update_note_qr_db(note_id, qr_code_data):
     try:
-        cursor.execute("UPDATE notes SET qr_code_data=? WHERE Id=?", (qr_code_data, note_id))
-        conn.commit()
-        return get_note_by_id_db(note_id), None
+        with transaction() as conn:
+            conn.execute("UPDATE notes SET qr_code_data=? WHERE Id=?", (qr_code_data, note_id))
+            return _execute(conn, f"SELECT {NOTE_COLUMNS} FROM notes WHERE Id=?", (note_id,), models.Note).fetchone(), None
     except Exception as e:
         return None, str(e)
 
-def delete_note_db(note_id):
+def fill_note_qr_db(note_id, qr_code_data):
+    # Sets qr_code_data only while it is empty, so a value a client stored
+    # with PUT /notes/{id}/qr is never overwritten. Returns the owner's
+    # user_id when the row changed.
     try:
-        note = get_note_by_id_db(note_id)
-        cursor.execute("DELETE FROM notes WHERE Id=?", (note_id,))
-        conn.commit()
-        return note, None
+        with transaction() as conn:
+            row = conn.execute(
+                "UPDATE notes SET qr_code_data=? WHERE Id=? AND COALESCE(qr_code_data, '')='' RETURNING user_id",
+                (qr_code_data, note_id)
+            ).fetchone()
+            return (row[0] if row else None), None
+    except Exception as e:
+        return None, str(e)
+
+def delete_note_db(note_id, user_id=None):
+    # Returns (None, None) when no note with that id belongs to user_id
+    where, owner = _owned(user_id)
+    try:
+        with transaction() as conn:
+            row = conn.execute(
+                f"DELETE FROM notes WHERE {where} RETURNING {NOTE_COLUMNS}, file_hash, file_thumbnail",
+                (note_id, *owner)
+            ).fetchone()
+            if row is None:
+                return None, None
+            note = models.row_factory(models.Note)(None, row[:-2])
+            file_hash, thumbnail = row[-2:]
+            conn.execute("DELETE FROM note_revisions WHERE note_id=?", (note_id,))
+            if file_hash is not None:
+                shared = conn.execute("SELECT 1 FROM notes WHERE file_hash=? LIMIT 1", (file_hash,)).fetchone()
+                if not shared:
+                    storage.delete(file_hash)
+                    # The thumbnail belongs to the same content, so it goes too
+                    if thumbnail and not conn.execute(
+                        "SELECT 1 FROM notes WHERE file_hash=? LIMIT 1", (thumbnail,)
+                    ).fetchone():
+                        storage.delete(thumbnail)
+            return note, None
     except Exception as e:
         return None, str(e)
@@ -0,0 +1,35 @@
+# Runs inside the ingest process pool, so this module must stay importable
+# without touching the database (workers are spawned, not forked).
+MAX_TEXT_CHARS = 500_000
+THUMBNAIL_WIDTH = 240
+
+def extract_pdf(path):
+    """Return the text, page count and first-page PNG thumbnail of a PDF."""
+    import pypdfium2 as pdfium
+    from io import BytesIO
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        pages = len(pdf)
+        parts, length = [], 0
+        for index in range(pages):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            text = textpage.get_text_range()
+            textpage.close()
+            page.close()
+            parts.append(text)
+            length += len(text)
+            if length >= MAX_TEXT_CHARS:
+                break
+        thumbnail = None
+        if pages:
+            page = pdf[0]
+            image = page.render(scale=THUMBNAIL_WIDTH / page.get_width()).to_pil()
+            page.close()
+            buf = BytesIO()
+            image.save(buf, format="PNG")
+            thumbnail = buf.getvalue()
+        return {"text": "\n".join(parts)[:MAX_TEXT_CHARS], "pages": pages, "thumbnail": thumbnail}
+    finally:
+        pdf.close()
@@ -0,0 +1,138 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from src import cache, db, storage
+from src.extraction import extract_pdf
+
+# --- Background attachment extraction ---
+# Uploads only record a job in the extraction_jobs table (same transaction as
+# the note insert). A dispatcher thread claims due jobs, no more than it has
+# free workers for, and runs them in a process pool. Jobs that fail are
+# retried with backoff. A worker that dies (a crashing PDF, the OOM killer)
+# breaks the whole pool: it is replaced and every job it was running counts
+# a failed attempt. Jobs abandoned by a dispatcher that died themselves are
+# reclaimed once their lease expires. Run `python -m src.ingest` to process the queue outside the API.
+WORKERS = int(os.getenv("STUDYQR_INGEST_WORKERS", "2"))
+LEASE_SECONDS = 300
+POLL_INTERVAL = 2.0
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30
+
+log = logging.getLogger(__name__)
+
+class Dispatcher:
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._executor = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None or self.workers <= 0:
+            return
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._thread = threading.Thread(target=self._run, name="studyqr-ingest", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join()
+        # Running jobs are abandoned; their lease expires and they are retried
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._thread = self._executor = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            with self._lock:
+                capacity = self.workers - self._in_flight
+            jobs = []
+            if capacity > 0:
+                try:
+                    jobs = db.claim_extraction_jobs_db(capacity, LEASE_SECONDS)
+                except Exception:
+                    log.exception("Claiming extraction jobs failed")
+            for job_id, file_hash, attempts in jobs:
+                with self._lock:
+                    self._in_flight += 1
+                    executor = self._executor
+                finish = partial(self._finish, job_id, file_hash, attempts, executor)
+                try:
+                    future = executor.submit(extract_pdf, storage.path_for(file_hash))
+                except BrokenProcessPool as e:
+                    # The pool is already broken: _finish replaces it, undoes
+                    # the in-flight count and requeues the job
+                    future = Future()
+                    future.set_exception(e)
+                future.add_done_callback(finish)
+            if not jobs:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+
+    def _replace_executor(self, broken):
+        # Only the first caller to see a broken pool replaces it
+        with self._lock:
+            if self._executor is not broken or self._stopping.is_set():
+                return
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        log.warning("An extraction worker died; restarted the process pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, job_id, file_hash, attempts, executor, future):
+        notes = []
+        try:
+            result = future.result()
+            thumbnail_hash = storage.save(result["thumbnail"])[0] if result["thumbnail"] else None
+            notes = db.complete_extraction_job_db(job_id, file_hash, result["text"], result["pages"], thumbnail_hash)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._replace_executor(executor)
+            if self._stopping.is_set():
+                return
+            retry_at = time.time() + RETRY_DELAY * 2 ** (attempts - 1) if attempts < MAX_ATTEMPTS else None
+            log.warning("Extraction of %s failed (attempt %d): %s", file_hash, attempts, e)
+            try:
+                notes = db.fail_extraction_job_db(job_id, file_hash, f"{type(e).__name__}: {e}", retry_at)
+            except Exception:
+                log.exception("Recording failure of extraction job %s failed", job_id)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._wake.set()
+        for note_id, user_id in notes:
+            cache.invalidate_note(note_id, user_id)
+
+_dispatcher = Dispatcher()
+
+def start():
+    _dispatcher.start()
+
+def stop():
+    _dispatcher.stop()
+
+def notify():
+    _dispatcher.notify()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    db.init_db()
+    start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop()
@@ -1,6 +1,51 @@
+import asyncio
+import base64
+import binascii
+import os
+import re
 from datetime import datetime
-import bcrypt
-from src import db
+import orjson
+
+from src import async_db, cache, db, ingest, models, passwords, publish, qr, sessions, storage
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# BM25 needs every matching document of each term to compute its weight; once
+# a term is this common it barely affects the ranking, so results are ordered
+# newest-first instead of paying that cost on every search.
+RANK_TERM_LIMIT = 2000
+BULK_MAX_ITEMS = 10000
+
+def _parse_fields(fields, allowed, default):
+    # "fields" is the comma-separated ?fields= value; Id is always returned so
+    # the caller can page on it.
+    if not fields:
+        return list(default)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return ["Id"] + [f for f in dict.fromkeys(requested) if f != "Id"]
+
+def _fts_terms(text):
+    # Every word becomes a quoted FTS5 term, so operators and punctuation in
+    # user input cannot cause syntax errors; a trailing "*" keeps a prefix query.
+    return [f'"{t[:-1]}"*' if t.endswith("*") else f'"{t}"' for t in re.findall(r"\w+\*?", text)]
+
+def _fts_query(terms, user_id=None):
+    # The subject filter is left to SQL: subjects are shared by many notes, and
+    # a very common phrase would make BM25 walk its whole doclist.
+    query = "{content subject file_text} : (" + " ".join(terms) + ")"
+    if user_id is not None:
+        query += f' AND user_id : "{int(user_id)}"'
+    return query
+
+def _page(rows, limit):
+    # Callers fetch limit + 1 rows; the extra one only signals another page.
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].Id
+    return rows, None
 
 class UserManager:
     def add_user(self, user_name, password_hash, email):
@@ -8,59 +53,420 @@ class UserManager:
         user, error = db.add_user_db(user_name, email, password_hash, created_at)
         if error:
             return {"Success": False, "Message": error}
-        return {"Success": True, "data": {"Id": user[0], "User_Name": user[1], "email": user[2]}}
+        return {"Success": True, "data": user}
 
-    def login_user(self, email, password):
-        user = db.get_user_by_email_db(email)
+    async def login_user(self, email, password):
+        # Raises passwords.PasswordHasherBusy when the hashing pool is saturated
+        user = await async_db.read(db.get_user_by_email_db, email)
         if not user:
             return {"Success": False, "Message": "User not found"}
         stored_hash = user[3]
-        if bcrypt.checkpw(password.encode("utf-8"), stored_hash.encode("utf-8")):
-            return {"Success": True, "user_id": user[0], "user_name": user[1]}
-        return {"Success": False, "Message": "Invalid credentials"}
+        if not await passwords.verify_password(password, stored_hash):
+            return {"Success": False, "Message": "Invalid credentials"}
+        if passwords.needs_rehash(stored_hash):
+            # Upgrade hashes made under an older STUDYQR_BCRYPT_ROUNDS; a failure
+            # here must not fail the login itself.
+            try:
+                new_hash = await passwords.hash_password(password)
+                await async_db.write(db.update_user_password_db, user[0], new_hash)
+            except passwords.PasswordHasherBusy:
+                pass
+        token, expires_at = sessions.issue(user[0], user[1])
+        return {"Success": True, "user_id": user[0], "user_name": user[1], "token": token, "expires_at": expires_at}
+
+    def list_users(self, after_id=None, limit=DEFAULT_PAGE_SIZE, order="asc", fields=None):
+        try:
+            columns = _parse_fields(fields, db.USER_FIELDS, ("Id", "User_Name", "email"))
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        rows = db.get_all_users_db(after_id, limit + 1, order == "desc", models.subset(models.User, columns))
+        users, next_cursor = _page(rows, limit)
+        return {"Success": True, "data": users, "next_cursor": next_cursor}
 
-    def get_users(self):
-        users = db.get_all_users_db()
-        return [{"Id": u[0], "User_Name": u[1], "email": u[2]} for u in users]
+    def list_users_summary(self, after_id=None, limit=DEFAULT_PAGE_SIZE, notes_per_user=10):
+        """A page of users, each with their note count and latest notes."""
+        result = self.list_users(after_id, limit)
+        if not result["Success"]:
+            return result
+        users = result["data"]
+        counts, latest = db.get_user_note_summaries_db([u.Id for u in users], notes_per_user)
+        notes = {}
+        for note in latest:
+            notes.setdefault(note.user_id, []).append(note)
+        data = [{**models.to_dict(u), "note_count": counts.get(u.Id, 0), "latest_notes": notes.get(u.Id, [])}
+                for u in users]
+        return {"Success": True, "data": data, "next_cursor": result["next_cursor"]}
 
 class NoteManager:
     def add_note(self, content, qr_code_data, user_id, subject, created_at=None, file_name=None, file_data=None):
         if not created_at:
             created_at = str(datetime.utcnow())
-        note, error = db.add_note_db(content, qr_code_data, user_id, subject, created_at, file_name, file_data)
+        file_hash = file_size = None
+        if file_data is not None:
+            file_hash, file_size = storage.save(file_data)
+        result = self._insert_note(content, qr_code_data, user_id, subject, created_at, file_name, file_hash, file_size)
+        return self._publish(result, [result["data"].Id] if result["Success"] else [])
+
+    def _insert_note(self, content, qr_code_data, user_id, subject, created_at, file_name, file_hash, file_size):
+        note, error = db.add_note_db(content, qr_code_data, user_id, subject, created_at, file_name, file_hash, file_size)
         if error:
             return {"Success": False, "Message": error}
-        return {"Success": True, "data": {"Id": note[0], "content": note[1], "qr_code_data": note[2], 
-                                          "user_id": note[3], "subject": note[4], "created_at": note[5],
-                                          "file_name": note[6] is not None and str(note[6]) or None}}
+        cache.user_notes.invalidate(tag=user_id)
+        if note.file_status == "pending":
+            ingest.notify()
+        return {"Success": True, "data": note}
+
+    def list_notes_by_user(self, user_id, after_id=None, limit=DEFAULT_PAGE_SIZE, order="asc", fields=None):
+        try:
+            columns = _parse_fields(fields, db.NOTE_FIELDS, db.NOTE_FIELDS)
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        page = cache.user_notes.get_or_load(
+            (user_id, after_id, limit, order, tuple(columns)),
+            lambda: self._load_notes_page(user_id, after_id, limit, order, columns),
+            tag=user_id
+        )
+        if page is None:
+            return {"Success": False, "Message": "Invalid cursor"}
+        return {"Success": True, "data": page["data"], "next_cursor": page["next_cursor"]}
+
+    def _load_notes_page(self, user_id, after_id, limit, order, columns):
+        rows = db.get_notes_by_user_db(user_id, after_id, limit + 1, order == "desc", models.subset(models.Note, columns))
+        if not rows and after_id is not None and not db.note_exists_db(after_id):
+            return None
+        notes, next_cursor = _page(rows, limit)
+        return {"data": notes, "next_cursor": next_cursor}
+
+    def search_notes(self, q, user_id=None, subject=None, limit=DEFAULT_PAGE_SIZE, offset=0):
+        terms = _fts_terms(q)
+        if not terms:
+            return {"Success": False, "Message": "Search query must contain at least one word"}
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        ranked = all(db.count_matches_db(_fts_query([t]), RANK_TERM_LIMIT) < RANK_TERM_LIMIT for t in terms)
+        rows = db.search_notes_db(_fts_query(terms, user_id), ranked, subject, limit + 1, offset)
+        results = rows[:limit]
+        next_offset = offset + limit if len(rows) > limit else None
+        return {"Success": True, "data": results, "next_offset": next_offset,
+                "ordering": "relevance" if ranked else "recency"}
+
+    def _bulk_row(self, item):
+        if not isinstance(item, dict):
+            raise ValueError("Item must be a JSON object")
+        for key in ("content", "subject"):
+            if not isinstance(item.get(key), str) or not item[key]:
+                raise ValueError(f"'{key}' is required and must be a non-empty string")
+        if not isinstance(item.get("user_id"), int) or isinstance(item["user_id"], bool):
+            raise ValueError("'user_id' is required and must be an integer")
+        for key in ("qr_code_data", "created_at", "file_name"):
+            if item.get(key) is not None and not isinstance(item[key], str):
+                raise ValueError(f"'{key}' must be a string")
+        file_name = item.get("file_name")
+        file_hash = file_size = None
+        if item.get("file_data") is not None:
+            try:
+                file_bytes = base64.b64decode(item["file_data"], validate=True)
+            except (binascii.Error, TypeError):
+                raise ValueError("'file_data' must be base64-encoded")
+            file_hash, file_size = storage.save(file_bytes)
+            file_name = file_name or "attachment"
+        return (item["content"], item.get("qr_code_data") or "", item["user_id"], item["subject"],
+                item.get("created_at") or str(datetime.utcnow()), file_name, file_size, file_hash)
+
+    def import_notes(self, items):
+        """Validate ``items`` one by one and insert the valid ones in a single transaction.
+
+        Invalid items are reported by their position in the input instead of
+        failing the whole batch.
+        """
+        if len(items) > BULK_MAX_ITEMS:
+            return {"Success": False, "Message": f"At most {BULK_MAX_ITEMS} notes per request"}
+        result = self._insert_import(*self._prepare_import(items))
+        return self._publish(result, [note["Id"] for note in result.get("data", [])])
+
+    def _prepare_import(self, items):
+        rows, positions, errors = [], [], []
+        for index, item in enumerate(items):
+            try:
+                rows.append(self._bulk_row(item))
+                positions.append(index)
+            except ValueError as e:
+                errors.append({"index": index, "Message": str(e)})
+        return rows, positions, errors
+
+    def _insert_import(self, rows, positions, errors):
+        created = []
+        if rows:
+            notes, error = db.add_notes_bulk_db(rows)
+            if error:
+                # Attachments were stored before the insert; drop the ones no note uses
+                db.discard_unused_files_db({row[7] for row in rows if row[7] is not None})
+                return {"Success": False, "Message": error, "errors": errors}
+            created = [{"index": index, **models.to_dict(note)} for index, note in zip(positions, notes)]
+            for user_id in {row[2] for row in rows}:
+                cache.user_notes.invalidate(tag=user_id)
+            if any(note.file_status == "pending" for note in notes):
+                ingest.notify()
+        return {"Success": True, "data": created, "errors": errors}
+
+    def iter_export(self, user_id, include_files=False):
+        """Yield one NDJSON line per note; the format round-trips through import_notes."""
+        for row in db.iter_notes_for_export_db(user_id):
+            note = models.to_dict(row)
+            file_hash = note.pop("file_hash")
+            if include_files and file_hash is not None:
+                with open(storage.path_for(file_hash), "rb") as f:
+                    note["file_data"] = base64.b64encode(f.read()).decode("ascii")
+            yield orjson.dumps(note) + b"\n"
 
-    def get_notes_by_user(self, user_id):
-        notes = db.get_notes_by_user_db(user_id)
-        return [{"Id": n[0], "content": n[1], "qr_code_data": n[2], "user_id": n[3], 
-                 "subject": n[4], "created_at": n[5], "file_name": n[6] if len(n) > 6 else None} for n in notes]
+    def iter_export_zip(self, user_id):
+        # notes.ndjson first, then each attachment under files/<Id>/<file_name>
+        def lines():
+            for row in db.iter_notes_for_export_db(user_id):
+                note = models.to_dict(row)
+                if note.pop("file_hash") is not None:
+                    note["file_path"] = f"files/{row.Id}/{os.path.basename(row.file_name or 'attachment')}"
+                yield orjson.dumps(note) + b"\n"
+
+        def members():
+            yield "notes.ndjson", lines(), True
+            for row in db.iter_notes_for_export_db(user_id):
+                if row.file_hash is not None:
+                    yield f"files/{row.Id}/{os.path.basename(row.file_name or 'attachment')}", storage.path_for(row.file_hash), False
+
+        return storage.iter_zip(members())
 
     def get_note_by_id(self, note_id):
-        note = db.get_note_by_id_db(note_id)
+        return cache.notes.get_or_load(note_id, lambda: db.get_note_by_id_db(note_id))
+
+    def get_note_file(self, note_id):
+        row = db.get_note_file_db(note_id)
+        if not row:
+            return None
+        return {"file_name": row[0] or "attachment", "file_hash": row[1], "file_size": row[2],
+                "path": storage.path_for(row[1])}
+
+    def get_note_thumbnail(self, note_id):
+        # PNG of the attachment's first page, once extraction has finished
+        thumbnail = db.get_note_thumbnail_db(note_id)
+        if not thumbnail:
+            return None
+        return {"file_hash": thumbnail, "path": storage.path_for(thumbnail)}
+
+    def extraction_stats(self):
+        return db.extraction_queue_stats_db()
+
+    def get_note_qr(self, note_id, view_url, fmt="png", box_size=10, error_correction="M"):
+        """Return ``(image_bytes, cache_key)`` for the note's QR code, or None if the note is gone.
+
+        The code always encodes ``view_url``, the note's current view page (the
+        same link the published page carries). The first time it is served,
+        ``view_url`` is also recorded in an empty qr_code_data so clients can
+        read the link; the stored value never changes the image.
+        """
+        note = self.get_note_by_id(note_id)
         if not note:
             return None
-        return {"Id": note[0], "content": note[1], "qr_code_data": note[2], 
-                "user_id": note[3], "subject": note[4], "created_at": note[5],
-                "file_name": note[6] if len(note) > 6 else None}
+        if not note.qr_code_data:
+            self._fill_qr_data(note_id, view_url)
+        return qr.render(view_url, fmt, box_size, error_correction)
 
-    def update_note(self, note_id, new_content):
-        note, error = db.update_note_db(note_id, new_content)
+    def _fill_qr_data(self, note_id, view_url):
+        # Best effort: failing to record the link must not fail serving the code
+        user_id, _ = db.fill_note_qr_db(note_id, view_url)
+        if user_id is not None:
+            cache.invalidate_note(note_id, user_id)
+
+    def _publish(self, result, note_ids):
+        # Static pages (src/publish.py) follow every content change
+        if result["Success"]:
+            publish.refresh(note_ids)
+        return result
+
+    def _not_owned(self, note_id, action, user_id=None):
+        # Only reached when an owner- or version-scoped write matched no row:
+        # tell a missing note apart from someone else's or a newer version.
+        note = db.get_note_by_id_db(note_id, fresh=True)
+        if not note:
+            return {"Success": False, "Message": "Note not found", "Status": 404}
+        if user_id is not None and note.user_id != user_id:
+            return {"Success": False, "Message": f"Not authorized to {action} this note", "Status": 403}
+        return {"Success": False, "Message": f"Note has changed; it is now at version {note.version}",
+                "Status": 412, "version": note.version, "note": note}
+
+    def update_note(self, note_id, new_content, user_id=None, expected_version=None):
+        """Replace the note's content, keeping the old text as a revision.
+
+        With ``user_id``, only if that user owns the note; with
+        ``expected_version``, only if nobody has changed it since.
+        """
+        return self._publish(self._update_note(note_id, new_content, user_id, expected_version), [note_id])
+
+    def _update_note(self, note_id, new_content, user_id=None, expected_version=None):
+        note, error = db.update_note_db(note_id, new_content, user_id, expected_version)
         if error:
             return {"Success": False, "Message": error}
-        return {"Success": True, "data": {"Id": note[0], "content": note[1]}}
+        if not note:
+            return self._not_owned(note_id, "update", user_id)
+        cache.invalidate_note(note_id, note.user_id)
+        return {"Success": True, "data": {"Id": note.Id, "content": note.content, "version": note.version}}
+
+    def list_revisions(self, note_id, before=None, limit=DEFAULT_PAGE_SIZE):
+        note = db.get_note_by_id_db(note_id, fresh=True)
+        if not note:
+            return {"Success": False, "Message": "Note not found", "Status": 404}
+        # One extra row: when a version was created is when the one before it was replaced
+        rows = db.list_note_revisions_db(note_id, before, limit + 1)
+        data = []
+        for i, revision in enumerate(rows[:limit]):
+            if i + 1 < len(rows):
+                created_at = rows[i + 1].replaced_at
+            else:
+                created_at = note.created_at if revision.version == 1 else None
+            data.append({"version": revision.version, "created_at": created_at, "replaced_at": revision.replaced_at,
+                         "kind": revision.kind, "size": revision.size})
+        next_cursor = data[-1]["version"] if len(rows) > limit else None
+        return {"Success": True, "data": data, "current_version": note.version, "next_cursor": next_cursor}
+
+    def get_revision(self, note_id, version):
+        content = db.get_note_revision_db(note_id, version)
+        if content is None:
+            return {"Success": False, "Message": "Revision not found", "Status": 404}
+        return {"Success": True, "data": {"Id": note_id, "version": version, "content": content}}
+
+    def restore_note(self, note_id, version, user_id=None, expected_version=None):
+        """Make the text of ``version`` current again, as a new version; history is kept."""
+        result = self.get_revision(note_id, version)
+        if not result["Success"]:
+            return result
+        return self.update_note(note_id, result["data"]["content"], user_id, expected_version)
 
     def update_qr_data(self, note_id, qr_code_data):
         note, error = db.update_note_qr_db(note_id, qr_code_data)
         if error:
             return {"Success": False, "Message": error}
-        return {"Success": True, "data": {"Id": note[0], "qr_code_data": note[2]}}
+        if not note:
+            return {"Success": False, "Message": "Note not found", "Status": 404}
+        cache.invalidate_note(note_id, note.user_id)
+        return {"Success": True, "data": {"Id": note.Id, "qr_code_data": note.qr_code_data}}
+
+    def delete_note(self, note_id, user_id=None):
+        """Delete the note; with ``user_id``, only if that user owns it."""
+        return self._publish(self._delete_note(note_id, user_id), [note_id])
 
-    def delete_note(self, note_id):
-        note, error = db.delete_note_db(note_id)
+    def _delete_note(self, note_id, user_id=None):
+        note, error = db.delete_note_db(note_id, user_id)
         if error:
             return {"Success": False, "Message": error}
-        return {"Success": True, "data": {"Id": note[0], "content": note[1]}}
+        if not note:
+            return self._not_owned(note_id, "delete", user_id)
+        cache.invalidate_note(note_id, note.user_id)
+        return {"Success": True, "data": {"Id": note.Id, "content": note.content}}
+
+# --- Async managers ---
+# Same results as UserManager/NoteManager, for async endpoints. Database work
+# goes through async_db (reads on reader threads, writes on the single writer);
+# file and image work goes to a worker thread, never the event loop.
+class AsyncUserManager:
+    def __init__(self, users=None):
+        self._users = users or UserManager()
+
+    async def add_user(self, user_name, password_hash, email):
+        return await async_db.write(self._users.add_user, user_name, password_hash, email)
+
+    async def login_user(self, email, password):
+        return await self._users.login_user(email, password)
+
+    async def list_users(self, after_id=None, limit=DEFAULT_PAGE_SIZE, order="asc", fields=None):
+        return await async_db.read(self._users.list_users, after_id, limit, order, fields)
+
+    async def list_users_summary(self, after_id=None, limit=DEFAULT_PAGE_SIZE, notes_per_user=10):
+        return await async_db.read(self._users.list_users_summary, after_id, limit, notes_per_user)
+
+class AsyncNoteManager:
+    def __init__(self, notes=None):
+        self._notes = notes or NoteManager()
+
+    async def add_note(self, content, qr_code_data, user_id, subject, created_at=None, file_name=None, file_data=None):
+        if not created_at:
+            created_at = str(datetime.utcnow())
+        file_hash = file_size = None
+        if file_data is not None:
+            # Copy the upload into the store before queueing behind other writes
+            file_hash, file_size = await asyncio.to_thread(storage.save, file_data)
+        result = await async_db.write(
+            self._notes._insert_note, content, qr_code_data, user_id, subject, created_at, file_name, file_hash, file_size
+        )
+        return await self._publish(result, [result["data"].Id] if result["Success"] else [])
+
+    async def list_notes_by_user(self, user_id, after_id=None, limit=DEFAULT_PAGE_SIZE, order="asc", fields=None):
+        return await async_db.read(self._notes.list_notes_by_user, user_id, after_id, limit, order, fields)
+
+    async def search_notes(self, q, user_id=None, subject=None, limit=DEFAULT_PAGE_SIZE, offset=0):
+        return await async_db.read(self._notes.search_notes, q, user_id, subject, limit, offset)
+
+    async def import_notes(self, items):
+        if len(items) > BULK_MAX_ITEMS:
+            return {"Success": False, "Message": f"At most {BULK_MAX_ITEMS} notes per request"}
+        # Decoding and storing attachments happens before taking the writer
+        prepared = await asyncio.to_thread(self._notes._prepare_import, items)
+        result = await async_db.write(self._notes._insert_import, *prepared)
+        return await self._publish(result, [note["Id"] for note in result.get("data", [])])
+
+    def iter_export(self, user_id, include_files=False):
+        # Streaming responses iterate this on Starlette's threadpool
+        return self._notes.iter_export(user_id, include_files)
+
+    def iter_export_zip(self, user_id):
+        return self._notes.iter_export_zip(user_id)
+
+    async def get_note_by_id(self, note_id):
+        return await async_db.read(self._notes.get_note_by_id, note_id)
+
+    async def get_note_file(self, note_id):
+        return await async_db.read(self._notes.get_note_file, note_id)
+
+    async def get_note_thumbnail(self, note_id):
+        return await async_db.read(self._notes.get_note_thumbnail, note_id)
+
+    async def extraction_stats(self):
+        return await async_db.read(self._notes.extraction_stats)
+
+    async def get_note_qr(self, note_id, view_url, fmt="png", box_size=10, error_correction="M"):
+        note = await self.get_note_by_id(note_id)
+        if not note:
+            return None
+        if not note.qr_code_data:
+            await async_db.write(self._notes._fill_qr_data, note_id, view_url)
+        return await asyncio.to_thread(qr.render, view_url, fmt, box_size, error_correction)
+
+    async def _publish(self, result, note_ids):
+        # Page files are written after the writer is released, not while holding it
+        if publish.ENABLED and result["Success"] and note_ids:
+            await asyncio.to_thread(publish.refresh, note_ids)
+        return result
+
+    async def update_note(self, note_id, new_content, user_id=None, expected_version=None):
+        result = await async_db.write(self._notes._update_note, note_id, new_content, user_id, expected_version)
+        return await self._publish(result, [note_id])
+
+    async def list_revisions(self, note_id, before=None, limit=DEFAULT_PAGE_SIZE):
+        return await async_db.read(self._notes.list_revisions, note_id, before, limit)
+
+    async def get_revision(self, note_id, version):
+        return await async_db.read(self._notes.get_revision, note_id, version)
+
+    async def restore_note(self, note_id, version, user_id=None, expected_version=None):
+        # Old versions never change, so rebuilding the text need not hold the writer
+        result = await self.get_revision(note_id, version)
+        if not result["Success"]:
+            return result
+        return await self.update_note(note_id, result["data"]["content"], user_id, expected_version)
+
+    async def update_qr_data(self, note_id, qr_code_data):
+        return await async_db.write(self._notes.update_qr_data, note_id, qr_code_data)
+
+    async def delete_note(self, note_id, user_id=None):
+        result = await async_db.write(self._notes._delete_note, note_id, user_id)
+        return await self._publish(result, [note_id])
@@ -0,0 +1,193 @@
+import logging
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+# --- Prometheus-style metrics ---
+# Counters and histograms kept in process memory and rendered in the
+# Prometheus text format at /metrics. Each uvicorn worker keeps its own
+# numbers, so scrape every worker (or run one) to see the whole picture.
+# STUDYQR_METRICS=0 turns recording off; the request middleware and the
+# timed database connections are then not installed at all.
+# STUDYQR_SLOW_QUERY_MS logs every SQL statement slower than that many ms.
+ENABLED = os.getenv("STUDYQR_METRICS", "1") != "0"
+SLOW_QUERY_MS = float(os.getenv("STUDYQR_SLOW_QUERY_MS", "0"))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+log = logging.getLogger(__name__)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}  # labels -> [per-bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            bucket = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+_registry = []
+_collectors = []
+
+def add_collector(collect):
+    """Register ``collect()``, returning ``(name, type, help, [(labels_dict, value), ...])`` tuples at scrape time."""
+    _collectors.append(collect)
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, kind, documentation, samples in collect():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# --- HTTP ---
+http_requests = Counter("studyqr_http_requests_total", "HTTP requests by route and status.",
+                        ("method", "route", "status"))
+http_duration = Histogram("studyqr_http_request_duration_seconds", "Time to the last response byte, by route.",
+                          ("method", "route"))
+
+class RequestMetrics:
+    """ASGI middleware recording per-route latency and status counts.
+
+    Routes are labelled by their path template (``/notes/{note_id}``), never the
+    raw path, so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            label = getattr(route, "path", None) or "unmatched"
+            http_duration.observe(time.perf_counter() - started, scope["method"], label)
+            http_requests.inc(scope["method"], label, str(status))
+
+# --- Database ---
+db_query_duration = Histogram("studyqr_db_query_duration_seconds", "SQL execute() time by statement.",
+                              ("statement",))
+db_rows = Counter("studyqr_db_rows_returned_total", "Rows fetched by statement.", ("statement",))
+db_bytes = Counter("studyqr_db_bytes_returned_total", "Size of TEXT (characters) and BLOB (bytes) values fetched, by statement.",
+                   ("statement", "type"))
+db_pool_wait = Histogram("studyqr_db_pool_wait_seconds", "Time spent waiting for a pooled connection.")
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    # One label per statement shape: whitespace collapsed, multi-row VALUES and
+    # IN lists of any length folded
+    label = re.sub(r"\s+", " ", sql).strip()
+    label = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+", "(...), ...", label)
+    label = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?, ...)", label)
+    return label[:200]
+
+def record_query(sql, seconds):
+    label = statement_label(sql)
+    if ENABLED:
+        db_query_duration.observe(seconds, label)
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        log.warning("Slow query (%.1f ms): %s", seconds * 1000, label)
+
+def record_rows(sql, rows):
+    if not ENABLED or not rows:
+        return
+    label = statement_label(sql)
+    text = blob = 0
+    for row in rows:
+        # Plain tuples, or row models (src/models.py) built by a row_factory
+        for value in (row if isinstance(row, tuple) else map(row.__getattribute__, row.__match_args__)):
+            if isinstance(value, str):
+                text += len(value)
+            elif isinstance(value, bytes):
+                blob += len(value)
+    db_rows.inc(label, amount=len(rows))
+    if text:
+        db_bytes.inc(label, "text", amount=text)
+    if blob:
+        db_bytes.inc(label, "blob", amount=blob)
+
+# --- Password hashing ---
+password_duration = Histogram("studyqr_password_hash_seconds", "bcrypt time per call, including queueing.",
+                              ("operation",))
+password_rejected = Counter("studyqr_password_hash_rejected_total", "Password hash calls refused while busy.")
@@ -0,0 +1,105 @@
+from dataclasses import dataclass, fields, make_dataclass
+from functools import lru_cache
+
+# --- Row models ---
+# Query results are built straight into these slotted dataclasses by a cursor
+# row_factory (db._execute), so a row costs one small object rather than a
+# tuple plus a dict, and orjson serializes them natively. Field order is both
+# the SELECT column order and the JSON key order. Instances handed out by the
+# caches are shared: treat them as read-only.
+
+@dataclass(slots=True)
+class Note:
+    Id: int
+    content: str
+    qr_code_data: str | None
+    user_id: int
+    subject: str
+    created_at: str
+    file_name: str | None
+    file_size: int | None
+    has_file: bool
+    file_status: str | None
+    file_pages: int | None
+    version: int
+
+@dataclass(slots=True)
+class ExportNote(Note):
+    # Locates the attachment in the store; not part of the exported JSON
+    file_hash: str | None
+
+@dataclass(slots=True)
+class NoteSummary:
+    Id: int
+    user_id: int
+    subject: str
+    created_at: str
+
+@dataclass(slots=True)
+class SearchHit:
+    Id: int
+    user_id: int
+    subject: str
+    created_at: str
+    file_name: str | None
+    has_file: bool
+    snippet: str
+    subject_highlight: str
+    file_snippet: str | None
+    score: float | None
+
+@dataclass(slots=True)
+class Revision:
+    # An earlier version of a note; ``size`` is what its stored form takes
+    version: int
+    kind: str
+    size: int
+    replaced_at: str
+
+@dataclass(slots=True)
+class User:
+    Id: int
+    User_Name: str
+    email: str
+    created_at: str
+
+# Fields computed in SQL rather than stored; SQLite has no boolean type, so
+# flags arrive as 0/1 and are converted by the row factory.
+EXPRESSIONS = {"has_file": "file_size IS NOT NULL"}
+BOOL_FIELDS = frozenset({"has_file"})
+
+@lru_cache(maxsize=None)
+def field_names(model):
+    return tuple(f.name for f in fields(model))
+
+def subset(model, names):
+    """``model`` narrowed to ``names`` (kept in the model's order), for ``?fields=`` selections."""
+    return _subset(model, frozenset(names))
+
+@lru_cache(maxsize=256)
+def _subset(model, names):
+    if names >= set(field_names(model)):
+        return model
+    return make_dataclass(model.__name__, [(f.name, f.type) for f in fields(model) if f.name in names], slots=True)
+
+@lru_cache(maxsize=256)
+def columns(model):
+    """The SELECT list producing ``model``'s fields in order."""
+    return ", ".join(f"{EXPRESSIONS[name]} AS {name}" if name in EXPRESSIONS else name for name in field_names(model))
+
+@lru_cache(maxsize=256)
+def row_factory(model):
+    flags = [i for i, name in enumerate(field_names(model)) if name in BOOL_FIELDS]
+    if not flags:
+        return lambda cursor, row: model(*row)
+
+    def factory(cursor, row):
+        values = list(row)
+        for i in flags:
+            values[i] = bool(values[i])
+        return model(*values)
+
+    return factory
+
+def to_dict(obj):
+    return {name: getattr(obj, name) for name in field_names(type(obj))}
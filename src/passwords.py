@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src import metrics
+
+# --- Password hashing off the request path ---
+# bcrypt is deliberately slow (~250 ms at cost 12), so hashes are computed in a
+# small process pool instead of on the API's threadpool. Once MAX_PENDING
+# calls are queued or running, new ones are refused with PasswordHasherBusy so
+# callers can answer 503 instead of letting a login burst stall every endpoint.
+BCRYPT_ROUNDS = int(os.getenv("STUDYQR_BCRYPT_ROUNDS", "12"))
+WORKERS = int(os.getenv("STUDYQR_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_PENDING = int(os.getenv("STUDYQR_HASH_MAX_PENDING", str(WORKERS * 8)))
+
+class PasswordHasherBusy(Exception):
+    pass
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+# bcrypt is imported by the worker processes that use it, not by the API itself
+def _hash(password, rounds):
+    import bcrypt
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+def _check(password, stored_hash):
+    import bcrypt
+    return bcrypt.checkpw(password.encode("utf-8"), stored_hash.encode("utf-8"))
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn, not fork: the API process holds SQLite connections and threads
+            _executor = ProcessPoolExecutor(WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+def _discard_executor(executor):
+    # A worker that dies (OOM killer, kill -9) breaks its pool for good. Drop
+    # it so the next call starts a fresh one; when several callers see the
+    # same failure, only the first replaces the pool.
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+async def _submit(operation, fn, *args):
+    global _pending
+    with _lock:
+        if _pending >= MAX_PENDING:
+            if metrics.ENABLED:
+                metrics.password_rejected.inc()
+            raise PasswordHasherBusy("Too many password checks in progress, retry shortly")
+        _pending += 1
+    started = time.perf_counter()
+    try:
+        for attempt in range(2):
+            executor = _get_executor()
+            try:
+                return await asyncio.wrap_future(executor.submit(fn, *args))
+            except BrokenProcessPool:
+                _discard_executor(executor)
+                if attempt:
+                    raise
+    finally:
+        with _lock:
+            _pending -= 1
+        if metrics.ENABLED:
+            metrics.password_duration.observe(time.perf_counter() - started, operation)
+
+async def hash_password(password):
+    return await _submit("hash", _hash, password, BCRYPT_ROUNDS)
+
+async def verify_password(password, stored_hash):
+    return await _submit("verify", _check, password, stored_hash)
+
+def needs_rehash(stored_hash):
+    # bcrypt hashes look like $2b$<cost>$<salt+digest>
+    try:
+        return int(stored_hash.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def shutdown():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,46 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# --- Sampling profiler ---
+# Off unless STUDYQR_PROFILER=1. While a profile is being taken, a background
+# thread snapshots every thread's stack each ``interval`` seconds; nothing is
+# hooked into request handling, so there is no cost between profiles. The
+# output is in the "collapsed stack" format read by flamegraph.pl/speedscope.
+ENABLED = os.getenv("STUDYQR_PROFILER", "0") == "1"
+MAX_SECONDS = 60
+
+_running = threading.Lock()
+
+class ProfilerBusy(Exception):
+    pass
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample(seconds, interval=0.005):
+    """Sample all threads for ``seconds`` and return collapsed stacks, hottest first."""
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already being taken")
+    try:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks = Counter()
+        deadline = time.monotonic() + min(seconds, MAX_SECONDS)
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                calls = []
+                while frame is not None:
+                    calls.append(_frame_name(frame))
+                    frame = frame.f_back
+                calls.append(names.get(ident, str(ident)))
+                stacks[";".join(reversed(calls))] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    finally:
+        _running.release()
@@ -0,0 +1,166 @@
+import hashlib
+import html
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from urllib.parse import quote
+
+from src import db, qr, storage
+
+# --- Static note pages ---
+# With STUDYQR_STATIC_DIR and STUDYQR_STATIC_URL set, each note's view page is
+# also written out as plain files whenever the note is created, edited or
+# deleted. QR codes then encode the static URL, so a scan is served by any
+# file server or CDN without reaching the API or the database:
+#   n/<id>/index.html            the page the QR code encodes
+#   n/<id>/qr-<sha>.png          the note's QR code, named by content
+#   n/<id>/<sha>/<file name>     the attachment, hard-linked from the store
+# index.html is the only file rewritten in place (serve it with a short
+# max-age); everything else is named by its content and can be cached forever.
+# `python -m src.publish rebuild` rewrites every page and removes the pages of
+# notes that no longer exist.
+STATIC_DIR = os.path.abspath(os.environ["STUDYQR_STATIC_DIR"]) if os.getenv("STUDYQR_STATIC_DIR") else None
+STATIC_URL = os.getenv("STUDYQR_STATIC_URL", "").rstrip("/")
+ENABLED = bool(STATIC_DIR and STATIC_URL)
+
+log = logging.getLogger(__name__)
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+  <head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>{title}</title>
+  </head>
+  <body>
+    <h2>{subject}</h2>
+    <pre style="white-space: pre-wrap; font-family: inherit; border: 1px solid #ddd; padding: 12px;">{content}</pre>
+    {file_section}
+    {qr_section}
+  </body>
+</html>
+"""
+
+def render_page(note, file_href=None, qr_src=None):
+    """The note's view page; shared by the API's /notes/view and the static export."""
+    file_section = qr_section = ""
+    if note.file_name and file_href:
+        file_section = f"<p><a href=\"{html.escape(file_href)}\">Download file ({html.escape(note.file_name)})</a></p>"
+    if qr_src:
+        qr_section = f"<p><img src=\"{html.escape(qr_src)}\" alt=\"QR code for this note\" width=\"160\"></p>"
+    return PAGE_TEMPLATE.format(
+        title=html.escape(note.subject or "Note"),
+        subject=html.escape(note.subject or ""),
+        content=html.escape(note.content),
+        file_section=file_section,
+        qr_section=qr_section,
+    )
+
+def page_url(note_id):
+    return f"{STATIC_URL}/n/{note_id}/"
+
+def _note_dir(note_id):
+    return os.path.join(STATIC_DIR, "n", str(note_id))
+
+def _write(path, data):
+    # Readers see either the old file or the new one, never a partial write
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".publish-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def _link_attachment(file_hash, target):
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        # Same filesystem as the store: share the inode instead of copying
+        os.link(storage.path_for(file_hash), tmp_path)
+    except OSError:
+        shutil.copyfile(storage.path_for(file_hash), tmp_path)
+    os.replace(tmp_path, target)
+
+def publish_note(note):
+    """Write ``note``'s page, QR image and attachment link, then drop what the previous version used."""
+    directory = _note_dir(note.Id)
+    os.makedirs(directory, exist_ok=True)
+    keep = {"index.html"}
+
+    file_href = None
+    if note.has_file:
+        row = db.get_note_file_db(note.Id, fresh=True)
+        if row and storage.exists(row[1]):
+            file_name = os.path.basename(row[0] or "attachment") or "attachment"
+            _link_attachment(row[1], os.path.join(directory, row[1], file_name))
+            file_href = f"{row[1]}/{quote(file_name)}"
+            keep.add(row[1])
+
+    image, _ = qr.render(page_url(note.Id))
+    qr_name = f"qr-{hashlib.sha256(image).hexdigest()[:16]}.png"
+    if not os.path.exists(os.path.join(directory, qr_name)):
+        _write(os.path.join(directory, qr_name), image)
+    keep.add(qr_name)
+
+    _write(os.path.join(directory, "index.html"), render_page(note, file_href, qr_name).encode("utf-8"))
+
+    for entry in os.listdir(directory):
+        if entry not in keep:
+            path = os.path.join(directory, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.unlink(path)
+
+def unpublish_note(note_id):
+    shutil.rmtree(_note_dir(note_id), ignore_errors=True)
+
+def refresh(note_ids):
+    """Bring the static pages of ``note_ids`` in line with the database.
+
+    Called after writes; failures are logged rather than raised because the
+    database change has already happened, and `rebuild` repairs any page left behind.
+    """
+    if not ENABLED:
+        return
+    for note_id in note_ids:
+        try:
+            note = db.get_note_by_id_db(note_id, fresh=True)
+            if note is None:
+                unpublish_note(note_id)
+            else:
+                publish_note(note)
+        except Exception:
+            log.exception("Publishing static page of note %s failed", note_id)
+
+def rebuild():
+    """Publish every note and remove pages whose note is gone. Returns ``(published, removed)``."""
+    published = set()
+    for note in db.iter_all_notes_db():
+        publish_note(note)
+        published.add(str(note.Id))
+    removed = 0
+    pages = os.path.join(STATIC_DIR, "n")
+    os.makedirs(pages, exist_ok=True)
+    for entry in os.listdir(pages):
+        if entry not in published:
+            shutil.rmtree(os.path.join(pages, entry), ignore_errors=True)
+            removed += 1
+    return len(published), removed
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m src.publish rebuild")
+    if not ENABLED:
+        sys.exit("Set STUDYQR_STATIC_DIR and STUDYQR_STATIC_URL to publish static pages")
+    db.init_db()
+    published, removed = rebuild()
+    log.info("Published %d notes to %s, removed %d stale pages", published, STATIC_DIR, removed)
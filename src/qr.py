@@ -0,0 +1,72 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from src import storage
+
+# --- QR image cache ---
+# Rendering a QR code costs a few milliseconds of pure Python; the images are
+# a pure function of (data, format, size, error correction), so each one is
+# rendered once, kept in a bounded in-memory LRU and persisted under QR_CACHE_DIR.
+QR_CACHE_DIR = os.path.abspath(os.getenv("STUDYQR_QR_CACHE_DIR", os.path.join(storage.DATA_DIR, "qr_cache")))
+MEMORY_CACHE_SIZE = int(os.getenv("STUDYQR_QR_MEMORY_CACHE", "512"))
+
+ERROR_CORRECTION_LEVELS = ("L", "M", "Q", "H")
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+
+def cache_key(data, fmt, box_size, error_correction):
+    return hashlib.sha256(f"{data}|{fmt}|{box_size}|{error_correction}".encode("utf-8")).hexdigest()
+
+def _generate(data, fmt, box_size, error_correction):
+    import qrcode
+    from io import BytesIO
+
+    level = getattr(qrcode.constants, f"ERROR_CORRECT_{error_correction}")
+    if fmt == "svg":
+        import qrcode.image.svg
+        image_factory = qrcode.image.svg.SvgPathImage
+    else:
+        image_factory = None
+    code = qrcode.QRCode(error_correction=level, box_size=box_size, image_factory=image_factory)
+    code.add_data(data)
+    buf = BytesIO()
+    image = code.make_image()
+    if fmt == "svg":
+        image.save(buf)
+    else:
+        image.save(buf, format="PNG")
+    return buf.getvalue()
+
+def _remember(key, image):
+    with _lock:
+        _memory[key] = image
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+def render(data, fmt="png", box_size=10, error_correction="M"):
+    """Return ``(image_bytes, cache_key)`` for a QR code encoding ``data``."""
+    key = cache_key(data, fmt, box_size, error_correction)
+    with _lock:
+        image = _memory.get(key)
+        if image is not None:
+            _memory.move_to_end(key)
+            return image, key
+    path = os.path.join(QR_CACHE_DIR, key[:2], f"{key}.{fmt}")
+    try:
+        with open(path, "rb") as f:
+            image = f.read()
+    except FileNotFoundError:
+        image = _generate(data, fmt, box_size, error_correction)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".qr-")
+        with os.fdopen(fd, "wb") as out:
+            out.write(image)
+        os.replace(tmp_path, path)
+    _remember(key, image)
+    return image, key
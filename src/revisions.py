@@ -0,0 +1,105 @@
+import os
+import re
+from difflib import SequenceMatcher
+from itertools import accumulate
+
+import orjson
+
+# --- Note revision deltas ---
+# The current text of a note stays in notes.content; each earlier version is
+# kept in note_revisions as a reverse delta: how to rebuild it from the
+# version after it. Every SNAPSHOT_EVERY-th version (and any version whose
+# delta would not be smaller) is stored in full instead, so rebuilding any
+# version applies at most SNAPSHOT_EVERY - 1 deltas, starting from the
+# nearest full copy above it.
+#
+# A delta is a JSON list: [start, end] copies those characters of the newer
+# text, a string is inserted as-is. Texts are matched line by line first,
+# then word by word inside the lines that changed, so editing one word of a
+# long paragraph stores a few small ops rather than the whole paragraph.
+SNAPSHOT_EVERY = int(os.getenv("STUDYQR_REVISION_SNAPSHOT_EVERY", "20"))
+# Unchanged runs shorter than this are cheaper to store as text than as a copy op
+MIN_COPY = 12
+# Word matching is quadratic in the worst case; larger rewrites are stored as text
+MAX_WORD_PAIRS = 4_000_000
+
+_TOKENS = re.compile(r"\s+|\w+|[^\w\s]")
+
+def _copy(ops, newer, start, end):
+    if end - start < MIN_COPY:
+        _insert(ops, newer[start:end])
+    elif ops and isinstance(ops[-1], list) and ops[-1][1] == start:
+        ops[-1][1] = end
+    else:
+        ops.append([start, end])
+
+def _insert(ops, text):
+    if not text:
+        return
+    if ops and isinstance(ops[-1], str):
+        ops[-1] += text
+    else:
+        ops.append(text)
+
+def _diff_words(ops, newer, start, end, older):
+    # newer[start:end] was replaced by older: keep the words they share. An
+    # edit usually touches a few words, so the shared prefix and suffix are
+    # copied directly and only the words between them are matched.
+    newer_words = _TOKENS.findall(newer, start, end)
+    older_words = _TOKENS.findall(older)
+    shortest = min(len(newer_words), len(older_words))
+    head = 0
+    while head < shortest and newer_words[head] == older_words[head]:
+        head += 1
+    tail = 0
+    while tail < shortest - head and newer_words[-1 - tail] == older_words[-1 - tail]:
+        tail += 1
+    newer_at = list(accumulate(map(len, newer_words), initial=start))
+    older_at = list(accumulate(map(len, older_words), initial=0))
+    newer_mid = newer_words[head:len(newer_words) - tail]
+    older_mid = older_words[head:len(older_words) - tail]
+
+    _copy(ops, newer, start, newer_at[head])
+    if len(newer_mid) * len(older_mid) > MAX_WORD_PAIRS:
+        _insert(ops, older[older_at[head]:older_at[len(older_words) - tail]])
+    else:
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, newer_mid, older_mid, autojunk=False).get_opcodes():
+            if tag == "equal":
+                _copy(ops, newer, newer_at[head + i1], newer_at[head + i2])
+            else:
+                _insert(ops, older[older_at[head + j1]:older_at[head + j2]])
+    _copy(ops, newer, newer_at[len(newer_words) - tail], end)
+
+def make_delta(newer, older):
+    """A delta that turns ``newer`` back into ``older``."""
+    newer_lines = newer.splitlines(keepends=True)
+    older_lines = older.splitlines(keepends=True)
+    newer_at = list(accumulate(map(len, newer_lines), initial=0))
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, newer_lines, older_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            _copy(ops, newer, newer_at[i1], newer_at[i2])
+        elif tag == "replace":
+            _diff_words(ops, newer, newer_at[i1], newer_at[i2], "".join(older_lines[j1:j2]))
+        elif tag == "insert":
+            _insert(ops, "".join(older_lines[j1:j2]))
+    return orjson.dumps(ops).decode("utf-8")
+
+def apply_delta(newer, delta):
+    return "".join(op if isinstance(op, str) else newer[op[0]:op[1]] for op in orjson.loads(delta))
+
+def encode(version, newer, older):
+    """``(kind, body)`` to store for ``older``, the text of ``version`` replaced by ``newer``."""
+    if version % SNAPSHOT_EVERY == 0:
+        return "snapshot", older
+    delta = make_delta(newer, older)
+    if len(delta) >= len(older):
+        return "snapshot", older
+    return "delta", delta
+
+def rebuild(start, chain):
+    """Apply ``chain`` (``(kind, body)`` pairs, newest first) to the text ``start``."""
+    text = start
+    for kind, body in chain:
+        text = body if kind == "snapshot" else apply_delta(text, body)
+    return text
@@ -0,0 +1,80 @@
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+from functools import lru_cache
+
+import orjson
+
+# --- Signed session tokens ---
+# /login hands out "<payload>.<signature>": the payload is base64url JSON with
+# the user id, name and expiry, signed with HMAC-SHA256 under
+# STUDYQR_SESSION_SECRET. Checking a token needs no database lookup, so it
+# survives API restarts and works on any worker that shares the secret.
+# Without a configured secret a random one is made per process, which logs
+# everyone out on restart and breaks sessions across uvicorn workers.
+TTL_SECONDS = int(os.getenv("STUDYQR_SESSION_TTL", str(7 * 24 * 3600)))
+
+log = logging.getLogger(__name__)
+
+_secret = None
+_secret_lock = threading.Lock()
+
+def _get_secret():
+    global _secret
+    with _secret_lock:
+        if _secret is None:
+            secret = os.getenv("STUDYQR_SESSION_SECRET", "").encode("utf-8")
+            if not secret:
+                log.warning("STUDYQR_SESSION_SECRET is not set; sessions will not survive a restart")
+                secret = secrets.token_bytes(32)
+            _secret = secret
+        return _secret
+
+class InvalidToken(Exception):
+    pass
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(payload):
+    return _b64encode(hmac.new(_get_secret(), payload.encode("ascii"), hashlib.sha256).digest())
+
+def issue(user_id, user_name):
+    """Return ``(token, expires_at)`` for a freshly authenticated user."""
+    expires_at = int(time.time()) + TTL_SECONDS
+    payload = _b64encode(orjson.dumps({"sub": user_id, "name": user_name, "exp": expires_at}))
+    return f"{payload}.{_sign(payload)}", expires_at
+
+@lru_cache(maxsize=4096)
+def _claims(token):
+    # Signature check and decoding happen once per token; clients send the
+    # same token on every request. Expiry is checked by the caller each time.
+    payload, _, signature = token.partition(".")
+    # compare_digest only takes ASCII str, so compare bytes: a token with
+    # stray non-ASCII characters must fail the check, not raise TypeError
+    expected = _sign(payload).encode("ascii")
+    if not signature or not hmac.compare_digest(signature.encode("utf-8", "surrogateescape"), expected):
+        raise InvalidToken("Invalid session token")
+    try:
+        claims = orjson.loads(_b64decode(payload))
+        return claims["sub"], claims["name"], claims["exp"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidToken("Invalid session token")
+
+def verify(token):
+    """Return ``(user_id, user_name)`` for a valid, unexpired token, else raise InvalidToken."""
+    try:
+        user_id, user_name, expires_at = _claims(token)
+    except UnicodeEncodeError:
+        raise InvalidToken("Invalid session token")
+    if expires_at <= time.time():
+        raise InvalidToken("Session expired")
+    return user_id, user_name
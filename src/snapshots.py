@@ -0,0 +1,62 @@
+import argparse
+import logging
+import os
+import sqlite3
+import time
+
+from src import db
+
+# --- Read snapshots ---
+# Copies the live database into db.SNAPSHOT_PATH with SQLite's online backup
+# API, which reads one consistent version without blocking writers (WAL).
+# The copy is made in a temporary file, switched to a rollback journal so it
+# is a single self-contained file, and renamed into place; processes started
+# with STUDYQR_DB_READ_FROM=snapshot open it immutable and pick up each new
+# snapshot within a second. Run one copy of
+#     python -m src.snapshots [--interval 30] [--once]
+# next to the API workers.
+INTERVAL = float(os.getenv("STUDYQR_SNAPSHOT_INTERVAL", "30"))
+
+log = logging.getLogger(__name__)
+
+def take_snapshot(target=None):
+    """Write a consistent copy of the database to ``target`` (default db.SNAPSHOT_PATH); returns its size."""
+    target = target or db.SNAPSHOT_PATH
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        copy = sqlite3.connect(tmp_path, isolation_level=None)
+        try:
+            with db.get_connection(readonly=True) as source:
+                # pages=-1: copy everything in one step, so concurrent commits
+                # cannot restart the backup
+                source.backup(copy, pages=-1)
+            copy.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            copy.close()
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return os.path.getsize(target)
+
+def main():
+    parser = argparse.ArgumentParser(description="Write read snapshots of the StudyQR database")
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="seconds between snapshots")
+    parser.add_argument("--once", action="store_true", help="take a single snapshot and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    db.init_db()
+    while True:
+        started = time.monotonic()
+        size = take_snapshot()
+        log.info("Snapshot of %s written to %s (%.1f MiB, %.2fs)", db.DB_PATH, db.SNAPSHOT_PATH,
+                 size / 2 ** 20, time.monotonic() - started)
+        if args.once:
+            return
+        time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import tempfile
+import time
+import zipfile
+
+# --- Content-addressed attachment store ---
+# Files live at <ATTACHMENT_DIR>/<sha[:2]>/<sha>; identical uploads share one file.
+# Note rows point into the store by hash, so like db.DB_PATH the location is
+# absolute and independent of the working directory: by default it sits
+# next to the database file (DATA_DIR), which db and qr resolve from too.
+DATA_DIR = os.path.dirname(os.path.abspath(os.getenv(
+    "STUDYQR_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "API", "studyqr.db")
+)))
+ATTACHMENT_DIR = os.path.abspath(os.getenv("STUDYQR_ATTACHMENT_DIR", os.path.join(DATA_DIR, "attachments")))
+CHUNK_SIZE = 64 * 1024
+
+def path_for(file_hash):
+    return os.path.join(ATTACHMENT_DIR, file_hash[:2], file_hash)
+
+def exists(file_hash):
+    return os.path.exists(path_for(file_hash))
+
+def save(data):
+    """Store ``data`` (bytes or a binary file object) and return ``(sha256, size)``.
+
+    File objects are copied CHUNK_SIZE bytes at a time, so memory use does not
+    depend on the attachment size.
+    """
+    os.makedirs(ATTACHMENT_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=ATTACHMENT_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                chunks = [data]
+            else:
+                chunks = iter(lambda: data.read(CHUNK_SIZE), b"")
+            for chunk in chunks:
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        file_hash = digest.hexdigest()
+        target = path_for(file_hash)
+        if os.path.exists(target):
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+        return file_hash, size
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def is_pdf(file_hash):
+    # PDF readers accept the header anywhere in the first 1 KiB
+    try:
+        with open(path_for(file_hash), "rb") as f:
+            return b"%PDF-" in f.read(1024)
+    except FileNotFoundError:
+        return False
+
+def delete(file_hash):
+    try:
+        os.unlink(path_for(file_hash))
+    except FileNotFoundError:
+        pass
+
+def iter_file(path, start=0, end=None, chunk_size=CHUNK_SIZE):
+    """Yield bytes ``start``..``end`` (inclusive) of ``path`` in chunks."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+class _ZipSink:
+    # Write-only target for ZipFile; iter_zip drains it after every write.
+    # Having no seek/tell makes zipfile use streaming data descriptors.
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def iter_zip(members):
+    """Stream a ZIP archive built from ``(arcname, source, compress)`` members.
+
+    ``source`` is a path in the store or an iterable of byte chunks. Nothing is
+    buffered beyond the chunk currently being written.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w") as archive:
+        for arcname, source, compress in members:
+            info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            chunks = iter_file(source) if isinstance(source, str) else source
+            with archive.open(info, "w", force_zip64=True) as dest:
+                for chunk in chunks:
+                    dest.write(chunk)
+                    if sink.chunks:
+                        yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# src reads its settings at import time, so point every path at a scratch
+# directory before anything imports it
+_workdir = tempfile.mkdtemp(prefix="studyqr-tests-")
+os.environ.update({
+    "STUDYQR_DB_PATH": os.path.join(_workdir, "studyqr.db"),
+    "STUDYQR_ATTACHMENT_DIR": os.path.join(_workdir, "attachments"),
+    "STUDYQR_QR_CACHE_DIR": os.path.join(_workdir, "qr_cache"),
+    "STUDYQR_INGEST_WORKERS": "0",
+    "STUDYQR_METRICS": "0",
+    "STUDYQR_SESSION_SECRET": "test-secret",
+})
+
+@pytest.fixture(scope="session")
+def db():
+    from src import db
+    db.init_db()
+    return db
@@ -0,0 +1,73 @@
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+import API.main
+from API.main import create_app
+from src import sessions
+from src.logic import NoteManager
+
+NDJSON_LINE = b'{"content": "x", "subject": "s", "user_id": 1}\n'
+
+@pytest.fixture
+def client(db):
+    with TestClient(create_app()) as client:
+        yield client
+
+def test_bulk_import_rejects_oversized_body(client, monkeypatch):
+    monkeypatch.setattr(API.main, "BULK_MAX_BYTES", 100)
+    response = client.post("/notes/bulk", content=NDJSON_LINE * 5, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 413
+
+    # Without Content-Length the limit is enforced while streaming
+    response = client.post("/notes/bulk", content=iter([NDJSON_LINE] * 5), headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 413
+
+def test_bulk_import_within_limit(client):
+    response = client.post("/notes/bulk", content=NDJSON_LINE * 2, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 2
+
+def test_retry_with_etag_from_412(client):
+    note = NoteManager().add_note("first", "", 44, "Maths")["data"]
+    auth = {"Authorization": f"Bearer {sessions.issue(44, 'ada')[0]}"}
+    etag = client.get(f"/notes/{note.Id}").headers["etag"]
+
+    response = client.put(f"/notes/{note.Id}", params={"content": "second"}, headers={**auth, "If-Match": etag})
+    assert response.status_code == 200
+
+    # The old tag is stale now; the 412 carries the tag GET returns
+    response = client.put(f"/notes/{note.Id}", params={"content": "third"}, headers={**auth, "If-Match": etag})
+    assert response.status_code == 412
+    current = response.headers["etag"]
+    assert current == client.get(f"/notes/{note.Id}").headers["etag"]
+
+    response = client.put(f"/notes/{note.Id}", params={"content": "third"}, headers={**auth, "If-Match": current})
+    assert response.status_code == 200
+    assert response.json()["data"]["version"] == 3
+
+@pytest.mark.parametrize("field, value", [("created_at", {"a": 1}), ("qr_code_data", 5), ("file_name", 5)])
+def test_bulk_import_reports_bad_optional_fields_per_item(client, field, value):
+    items = [{"content": "ok", "subject": "s", "user_id": 46}, {"content": "bad", "subject": "s", "user_id": 46, field: value}]
+    response = client.post("/notes/bulk", json=items)
+    assert response.status_code == 200
+    body = response.json()
+    assert [note["index"] for note in body["data"]] == [0]
+    assert body["errors"] == [{"index": 1, "Message": f"'{field}' must be a string"}]
+
+@pytest.mark.parametrize("file_name, disposition", [
+    ("notes.pdf", 'attachment; filename="notes.pdf"'),
+    ("Конспект.pdf", "attachment; filename*=utf-8''%D0%9A%D0%BE%D0%BD%D1%81%D0%BF%D0%B5%D0%BA%D1%82.pdf"),
+    ('say "hi".txt', "attachment; filename*=utf-8''say%20%22hi%22.txt"),
+])
+def test_download_encodes_file_name(client, file_name, disposition):
+    note = NoteManager().add_note("x", "", 48, "S", file_name=file_name, file_data=b"0123456789")["data"]
+    response = client.get(f"/notes/download/{note.Id}")
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == disposition
+
+    response = client.get(f"/notes/download/{note.Id}", headers={"Range": "bytes=2-4"})
+    assert response.status_code == 206
+    assert response.content == b"234"
+    assert response.headers["content-disposition"] == disposition
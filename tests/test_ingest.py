@@ -0,0 +1,42 @@
+import os
+import time
+
+from src import ingest
+from src.logic import NoteManager
+
+def crash_or_extract(path):
+    # Stands in for extract_pdf inside the worker process
+    with open(path, "rb") as f:
+        if b"crash" in f.read():
+            os._exit(1)
+    return {"text": "extracted", "pages": 1, "thumbnail": None}
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_dispatcher_survives_a_dying_worker(db, monkeypatch):
+    monkeypatch.setattr(ingest, "extract_pdf", crash_or_extract)
+    monkeypatch.setattr(ingest, "POLL_INTERVAL", 0.1)
+    monkeypatch.setattr(ingest, "RETRY_DELAY", 3600)
+    notes = NoteManager()
+    dispatcher = ingest.Dispatcher(workers=1)
+    dispatcher.start()
+    try:
+        crashing = notes.add_note("a", "", 45, "S", file_name="a.pdf", file_data=b"%PDF-1.4 crash")["data"]
+        job = lambda: db._fetchone("SELECT status, attempts FROM extraction_jobs WHERE file_hash="
+                                   "(SELECT file_hash FROM notes WHERE Id=?)", (crashing.Id,), fresh=True)
+        assert wait_for(lambda: job() == ("queued", 1))
+        assert wait_for(lambda: dispatcher._in_flight == 0)
+
+        # The dispatcher carries on with a fresh pool
+        fine = notes.add_note("b", "", 45, "S", file_name="b.pdf", file_data=b"%PDF-1.4 fine")["data"]
+        dispatcher.notify()
+        assert wait_for(lambda: db.get_note_by_id_db(fine.Id, fresh=True).file_status == "ready")
+        assert dispatcher._thread.is_alive()
+    finally:
+        dispatcher.stop()
@@ -0,0 +1,53 @@
+import base64
+import hashlib
+
+import pytest
+
+from src import storage
+from src.logic import NoteManager
+
+def test_update_qr_data_of_missing_note(db):
+    result = NoteManager().update_qr_data(10 ** 9, "https://example.com")
+    assert result == {"Success": False, "Message": "Note not found", "Status": 404}
+
+def test_update_qr_data(db):
+    notes = NoteManager()
+    note = notes.add_note("text", "", 42, "Maths")["data"]
+    result = notes.update_qr_data(note.Id, "https://example.com/n")
+    assert result == {"Success": True, "data": {"Id": note.Id, "qr_code_data": "https://example.com/n"}}
+    assert notes.get_note_by_id(note.Id).qr_code_data == "https://example.com/n"
+
+def test_qr_image_encodes_view_url_and_fills_empty_qr_data(db):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("qrcode")
+    from fastapi.testclient import TestClient
+    from API.main import create_app
+    from src import qr
+
+    notes = NoteManager()
+    stored = notes.add_note("text", "https://elsewhere.example/", 43, "Maths")["data"]
+    empty = notes.add_note("text", "", 43, "Maths")["data"]
+    with TestClient(create_app()) as client:
+        client.put(f"/notes/{stored.Id}/qr", params={"qr_code_data": "https://changed.example/"})
+        responses = [client.get(f"/notes/{note.Id}/qr.png") for note in (stored, empty)]
+    for note, response in zip((stored, empty), responses):
+        assert response.status_code == 200
+        expected = qr.cache_key(f"http://testserver/notes/view/{note.Id}", "png", 10, "M")
+        assert response.headers["etag"] == f'"{expected}"'
+
+    # Serving the code records the view URL in an empty qr_code_data, never over a stored one
+    assert notes.get_note_by_id(stored.Id).qr_code_data == "https://changed.example/"
+    assert notes.get_note_by_id(empty.Id).qr_code_data == f"http://testserver/notes/view/{empty.Id}"
+
+def test_failed_import_removes_its_new_attachments(db, monkeypatch):
+    notes = NoteManager()
+    kept = notes.add_note("kept", "", 47, "S", file_name="kept.txt", file_data=b"shared attachment")["data"]
+    kept_hash = db._fetchone("SELECT file_hash FROM notes WHERE Id=?", (kept.Id,), fresh=True)[0]
+    monkeypatch.setattr(db, "add_notes_bulk_db", lambda rows: (None, "disk I/O error"))
+
+    items = [{"content": "a", "subject": "s", "user_id": 47, "file_data": base64.b64encode(data).decode()}
+             for data in (b"shared attachment", b"only in the failed import")]
+    result = notes.import_notes(items)
+    assert not result["Success"]
+    assert storage.exists(kept_hash)
+    assert not storage.exists(hashlib.sha256(b"only in the failed import").hexdigest())
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from src import passwords
+
+@pytest.fixture
+def fast_hashes(monkeypatch):
+    pytest.importorskip("bcrypt")
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 4)
+    yield
+    passwords.shutdown()
+
+def test_hash_and_verify(fast_hashes):
+    async def scenario():
+        stored = await passwords.hash_password("secret")
+        return await passwords.verify_password("secret", stored), await passwords.verify_password("nope", stored)
+    assert asyncio.run(scenario()) == (True, False)
+
+def test_recovers_when_a_worker_dies(fast_hashes):
+    async def scenario():
+        stored = await passwords.hash_password("secret")
+        broken = passwords._executor
+        for process in list(broken._processes.values()):
+            process.kill()
+            process.join()
+        assert await passwords.verify_password("secret", stored)
+        return broken
+    broken = asyncio.run(scenario())
+    assert passwords._executor is not None and passwords._executor is not broken
@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+from src import revisions
+
+WORDS = ("cell", "energy", "vector", "matrix", "protein", "orbit", "theorem", "market", "enzyme", "signal")
+
+def paragraph(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+def test_one_word_edit_of_a_paragraph_stores_a_small_delta():
+    rng = random.Random(1)
+    older = paragraph(rng, 330)
+    words = older.split(" ")
+    words[150] = "photosynthesis"
+    newer = " ".join(words)
+    assert len(older) > 2000
+
+    kind, body = revisions.encode(1, newer, older)
+    assert kind == "delta"
+    assert len(body) < 60
+    assert revisions.apply_delta(newer, body) == older
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_edits_round_trip(seed):
+    rng = random.Random(seed)
+    older = "\n".join(paragraph(rng, rng.randint(0, 40)) for _ in range(rng.randint(0, 6)))
+    newer = older
+    for _ in range(rng.randint(0, 5)):
+        at = rng.randint(0, len(newer))
+        cut = rng.randint(0, 30)
+        newer = newer[:at] + rng.choice(["", " ", "\n", paragraph(rng, rng.randint(1, 5))]) + newer[at + cut:]
+    assert revisions.apply_delta(newer, revisions.make_delta(newer, older)) == older
+    assert revisions.apply_delta(older, revisions.make_delta(older, newer)) == newer
+
+def test_unicode_and_line_endings_round_trip():
+    older = "Конспект: énergie\r\nline two\rline three\n\nend"
+    newer = "Конспект: energy\r\nline 2\rline three\nend\n"
+    assert revisions.apply_delta(newer, revisions.make_delta(newer, older)) == older
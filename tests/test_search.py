@@ -0,0 +1,18 @@
+from src.logic import NoteManager
+
+def test_highlights_escape_note_markup(db):
+    notes = NoteManager()
+    note = notes.add_note('<img src=x onerror=alert(1)> photosynthesis & "light"', "", 41,
+                          "<script>Biology</script>")["data"]
+
+    result = notes.search_notes("photosynthesis", user_id=41)
+    assert result["Success"]
+    [hit] = result["data"]
+    assert hit.Id == note.Id
+    assert hit.snippet == ("&lt;img src=x onerror=alert(1)&gt; <mark>photosynthesis</mark> "
+                           "&amp; &quot;light&quot;")
+    assert hit.subject_highlight == "&lt;script&gt;Biology&lt;/script&gt;"
+    assert hit.file_snippet is None
+
+    [hit] = notes.search_notes("biology", user_id=41)["data"]
+    assert hit.subject_highlight == "&lt;script&gt;<mark>Biology</mark>&lt;/script&gt;"
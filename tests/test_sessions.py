@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+from src import sessions
+
+def test_issued_token_verifies():
+    token, expires_at = sessions.issue(7, "ada")
+    assert sessions.verify(token) == (7, "ada")
+    assert expires_at > time.time()
+
+@pytest.mark.parametrize("token", [
+    "",
+    "no-signature",
+    "abc.def",
+    "abc.\xe9",
+    "\xe9.abc",
+    "abc.\udcff",
+    "..",
+])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(sessions.InvalidToken):
+        sessions.verify(token)
+
+def test_tampered_payload_is_rejected():
+    token, _ = sessions.issue(7, "ada")
+    other, _ = sessions.issue(8, "bob")
+    with pytest.raises(sessions.InvalidToken):
+        sessions.verify(other.split(".")[0] + "." + token.split(".")[1])
+
+def test_expired_token_is_rejected(monkeypatch):
+    monkeypatch.setattr(sessions, "TTL_SECONDS", -1)
+    token, _ = sessions.issue(7, "ada")
+    with pytest.raises(sessions.InvalidToken, match="expired"):
+        sessions.verify(token)
+
+def test_non_ascii_bearer_token_gets_401():
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    from API.main import create_app
+
+    with TestClient(create_app()) as client:
+        response = client.delete("/notes/1", headers={"Authorization": "Bearer abc.\xe9".encode("latin-1")})
+    assert response.status_code == 401